@@ -1,7 +1,6 @@
 import streamlit as st
 import os
 import gc
-import shutil
 import git
 from dotenv import load_dotenv
 
@@ -9,7 +8,9 @@ from dotenv import load_dotenv
 from src.repocopilot.retriever.engine import HybridRetriever
 from src.repocopilot.agent.llm import LLMClient
 from src.repocopilot.agent.core import RepoCopilotAgent
-from src.repocopilot.indexer.build import IndexBuilder
+from src.repocopilot.agent.cache import AnswerCache
+from src.repocopilot.indexer.registry import IndexRegistry
+from src.repocopilot.indexer.worker import IndexingWorker
 
 # 1. LOAD DOTENV FIRST
 load_dotenv(override=True)
@@ -82,82 +83,152 @@ def clone_repo(url):
         raise Exception(f"Failed to clone repository: {e}")
 
 
-def rebuild_index(target_path):
-    if os.path.exists("data/qdrant"):
-        shutil.rmtree("data/qdrant", ignore_errors=True)
+def pull_repo(path):
+    """Fast-forwards a cloned repository to its upstream branch."""
+    try:
+        repo = git.Repo(path)
+        before = repo.head.commit.hexsha
+        repo.remotes.origin.pull()
+        after = repo.head.commit.hexsha
+    except Exception as e:
+        raise Exception(f"Failed to pull repository: {e}")
+    if before == after:
+        return "Already up to date."
+    return f"Updated {before[:8]} -> {after[:8]}."
 
-    # Clean up both potential files
-    if os.path.exists("data/bm25.pkl"):
-        os.remove("data/bm25.pkl")
-    if os.path.exists("data/bm25.json"):
-        os.remove("data/bm25.json")
 
-    provider = os.getenv("EMBEDDING_PROVIDER", "mock")
+INDEX_REGISTRY = IndexRegistry()
+
+
+def ignore_dirs_for(target_path):
     # Rule for RepoCopilot self-indexing
-    ignore_list = None
     if target_path == "." or target_path == os.getcwd():
-        ignore_list = ["repos", "data", ".venv", "__pycache__", ".git"]
+        return ["repos", "data", ".venv", "__pycache__", ".git"]
+    return None
+
 
-    builder = IndexBuilder(
-        repo_path=target_path,
-        use_mock_embedding=(provider == "mock"),
-        ignore_dirs=ignore_list,
+def format_metrics(metrics):
+    return (
+        f"⏱️ First token {metrics.get('ttft_ms', 0) / 1000:.2f}s · "
+        f"{metrics['tokens_per_s']:.0f} tok/s · {metrics.get('tokens', 0)} tokens"
     )
-    builder.build()
 
-    # Validation: Check for JSON file
-    if not os.path.exists("data/bm25.json"):
-        raise Exception(
-            "Indexing failed: 'data/bm25.json' was not created. Found 0 files?"
-        )
+
+@st.cache_resource
+def get_worker():
+    """One background indexing worker shared by every session of this server."""
+    provider = os.getenv("EMBEDDING_PROVIDER", "mock")
+    return IndexingWorker(INDEX_REGISTRY, use_mock_embedding=(provider == "mock"))
 
 
 @st.cache_resource
-def init_agent(repo_path_hash):
+def get_answer_cache():
+    """Answers shared by all sessions; None when ANSWER_CACHE=0."""
+    if os.getenv("ANSWER_CACHE", "1") == "0":
+        return None
+    return AnswerCache(
+        path=os.getenv("ANSWER_CACHE_PATH", "data/answer_cache.db"),
+        similarity_threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95)),
+    )
+
+
+@st.cache_resource
+def init_agent(repo_path_hash, index_dir):
     gc.collect()
     provider = os.getenv("EMBEDDING_PROVIDER", "mock")
     use_mock = provider == "mock"
+    INDEX_REGISTRY.touch(repo_path_hash)
     retriever = HybridRetriever(
-        bm25_path="data/bm25.pkl",
-        qdrant_path="data/qdrant",
+        bm25_path=os.path.join(index_dir, "bm25.pkl"),
+        qdrant_path=os.path.join(index_dir, "qdrant"),
         use_mock_embedding=use_mock,
     )
     llm = LLMClient()
-    return RepoCopilotAgent(retriever, llm)
+    return RepoCopilotAgent(retriever, llm, answer_cache=get_answer_cache())
 
 
-def perform_switch(target_path, display_name, status_container):
-    """Executes the sequence to switch the active repository."""
+def release_agent():
+    """
+    Stops serving the current index in this session. The shared agent is closed, and
+    old versions are dropped, only once no other session is using that version.
+    """
+    current_repo = st.session_state.get("current_repo_path", ".")
+    served_dir = st.session_state.get("served_index_dir")
+    st.session_state.served_index_dir = None
+    if not served_dir or INDEX_REGISTRY.release(served_dir) > 0:
+        return
     try:
-        # 1. Close existing agent
-        current_repo = st.session_state.get("current_repo_path", ".")
-        try:
-            old_agent = init_agent(current_repo)
-            if old_agent:
-                old_agent.close()
-        except Exception:
-            pass
-
-        # 2. Clear Cache
-        init_agent.clear()
-
-        # 3. Rebuild Index
-        status_container.write("🧠 Rebuilding Index...")
-        rebuild_index(target_path)
-
-        # 4. Update State
-        st.session_state.current_repo_path = target_path
-        st.session_state.selected_repo_name = display_name
+        old_agent = init_agent(current_repo, served_dir)
+        if old_agent:
+            old_agent.close()
+    except Exception:
+        pass
+    init_agent.clear(current_repo, served_dir)
+    INDEX_REGISTRY.prune(current_repo)
+
+
+def activate_repo(target_path, display_name):
+    """Starts serving the (already built) index of `target_path`."""
+    same_repo = target_path == st.session_state.get("current_repo_path")
+    release_agent()
+    st.session_state.current_repo_path = target_path
+    st.session_state.selected_repo_name = display_name
+    if not same_repo:
         st.session_state.messages = []
+    save_repo_state(target_path, display_name)
 
-        # 5. Persist
-        save_repo_state(target_path, display_name)
 
-        status_container.update(label="✅ Ready!", state="complete", expanded=False)
-        st.rerun()
+def perform_switch(target_path, display_name, status_container):
+    """
+    Switches immediately when the target's index is up to date, otherwise queues a
+    background build; the current index keeps serving queries until it finishes.
+    """
+    try:
+        status_container.write("🧠 Checking Index...")
+        switched = INDEX_REGISTRY.is_fresh(target_path)
+        if switched:
+            status_container.write("⚡ Reusing existing index.")
+            activate_repo(target_path, display_name)
+            status_container.update(label="✅ Ready!", state="complete", expanded=False)
+        else:
+            job = get_worker().submit(
+                target_path, display_name, ignore_dirs=ignore_dirs_for(target_path)
+            )
+            st.session_state.pending_job_id = job.id
+            status_container.update(
+                label="⏳ Indexing in background...", state="complete", expanded=False
+            )
     except Exception as e:
         status_container.update(label="❌ Error", state="error")
         st.sidebar.error(str(e))
+        return
+
+    if switched:
+        st.rerun()
+
+
+@st.fragment(run_every=1.0)
+def indexing_status():
+    """Live progress of the pending background build; swaps the index when done."""
+    job_id = st.session_state.get("pending_job_id")
+    job = get_worker().get(job_id) if job_id else None
+    if job is None:
+        return
+
+    if not job.finished:
+        st.progress(job.fraction, text=job.summary())
+        if st.button("✖️ Cancel Indexing", key=f"cancel_{job.id}"):
+            job.cancel()
+        return
+
+    st.session_state.pending_job_id = None
+    if job.status == "done":
+        activate_repo(job.repo_path, job.display_name)
+        st.rerun(scope="app")
+    elif job.status == "cancelled":
+        st.warning(f"Indexing of {job.display_name} was cancelled.")
+    else:
+        st.error(f"Indexing of {job.display_name} failed: {job.error}")
 
 
 # 4. Session State Initialization
@@ -190,6 +261,18 @@ with st.sidebar:
                 os.path.join("repos", selected_repo), selected_repo, status_box
             )
 
+    if selected_repo != "RepoCopilot (Source)" and st.button(
+        "🔃 Pull & Update Index", use_container_width=True
+    ):
+        status_box = st.status("🚀 Pulling...", expanded=True)
+        try:
+            target = os.path.join("repos", selected_repo)
+            status_box.write(pull_repo(target))
+            perform_switch(target, selected_repo, status_box)
+        except Exception as e:
+            status_box.update(label="❌ Pull Failed", state="error")
+            st.error(str(e))
+
     st.divider()
     st.subheader("Clone New")
     with st.form("clone_form", clear_on_submit=False):
@@ -212,6 +295,8 @@ with st.sidebar:
                 status_box.update(label="❌ Clone Failed", state="error")
                 st.error(str(e))
 
+    indexing_status()
+
     st.divider()
     st.info(f"Active: **{st.session_state.selected_repo_name}**")
     st.caption(f"🤖 Model: {os.getenv('MODEL_NAME', '⚠️ NOT SET')}")
@@ -219,7 +304,29 @@ with st.sidebar:
 
 # 6. Main Agent Initialization
 try:
-    agent = init_agent(st.session_state.current_repo_path)
+    current_repo = st.session_state.current_repo_path
+    index_dir = INDEX_REGISTRY.path_for(current_repo)
+    if (
+        not os.path.exists(os.path.join(index_dir, "bm25.bm25"))
+        and not st.session_state.get("pending_job_id")
+        and st.session_state.get("auto_indexed_repo") != current_repo
+    ):
+        # First run for this repository: build it in the background (once)
+        st.session_state.auto_indexed_repo = current_repo
+        job = get_worker().submit(
+            current_repo,
+            st.session_state.selected_repo_name,
+            ignore_dirs=ignore_dirs_for(current_repo),
+        )
+        st.session_state.pending_job_id = job.id
+    if st.session_state.get("served_index_dir") not in (None, index_dir):
+        # A newer version was published (e.g. by another session): swap to it
+        release_agent()
+    if st.session_state.get("served_index_dir") != index_dir:
+        # Keeps this version from being pruned or evicted while the session uses it
+        INDEX_REGISTRY.acquire(index_dir)
+        st.session_state.served_index_dir = index_dir
+    agent = init_agent(current_repo, index_dir)
 except Exception as e:
     st.error(f"Configuration Error: {e}")
     agent = None
@@ -242,6 +349,8 @@ if "messages" not in st.session_state:
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
+        if message.get("metrics", {}).get("tokens_per_s"):
+            st.caption(format_metrics(message["metrics"]))
         if "sources" in message and message["sources"]:
             with st.expander("📚 View Evidence Sources"):
                 for i, res in enumerate(message["sources"]):
@@ -257,18 +366,31 @@ if prompt := st.chat_input("Ask about the code..."):
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
+        result = None
         with st.status("🕵️ Analyzing...", expanded=True) as status:
             try:
-                result = agent.answer(prompt)
-                response_text = result["content"]
+                result = agent.answer(prompt, stream=True)
                 sources = result["sources"]
-                status.update(label="✅ Done!", state="complete", expanded=False)
+                label = "⚡ Answered from cache" if result.get("cached") else "✅ Done!"
+                status.update(label=label, state="complete", expanded=False)
             except Exception as e:
                 status.update(label="❌ Error", state="error")
                 response_text = f"Error: {str(e)}"
                 sources = []
 
-        st.markdown(response_text)
+        metrics = {}
+        if result is not None:
+            try:
+                # Render tokens as they arrive instead of waiting for the full answer
+                response_text = st.write_stream(result["stream"])
+                metrics = result["metrics"]
+            except Exception as e:
+                response_text = f"Error: {str(e)}"
+        else:
+            st.markdown(response_text)
+
+        if metrics.get("tokens_per_s"):
+            st.caption(format_metrics(metrics))
 
         if sources:
             with st.expander("📚 View Evidence Sources"):
@@ -280,6 +402,11 @@ if prompt := st.chat_input("Ask about the code..."):
                     st.code(chunk.content, language="python")
 
         st.session_state.messages.append(
-            {"role": "assistant", "content": response_text, "sources": sources}
+            {
+                "role": "assistant",
+                "content": response_text,
+                "sources": sources,
+                "metrics": metrics,
+            }
         )
         st.rerun()
@@ -17,6 +17,12 @@ def main():
 
     parser = argparse.ArgumentParser(description="RepoCopilot Q&A CLI")
     parser.add_argument("question", type=str, help="The question about the codebase")
+    parser.add_argument(
+        "--repo",
+        type=str,
+        default=".",
+        help="Repository whose published index to use (see data/indexes)",
+    )
     parser.add_argument(
         "--use_real_embedding",
         action="store_true",
@@ -27,10 +33,8 @@ def main():
 
     # 1. Initialize Components
     # Using mock embedding if specified, otherwise real ones
-    retriever = HybridRetriever(
-        bm25_path="data/bm25.pkl",
-        qdrant_path="data/qdrant",
-        use_mock_embedding=not args.use_real_embedding,
+    retriever = HybridRetriever.for_repo(
+        args.repo, use_mock_embedding=not args.use_real_embedding
     )
 
     llm = LLMClient()  # Will use values from .env automatically
@@ -41,8 +45,17 @@ def main():
     print("-" * 50)
 
     try:
-        answer = agent.answer(args.question)
-        print(f"\n💡 Answer:\n{answer}")
+        result = agent.answer(args.question, stream=True)
+        print("\n💡 Answer:")
+        for delta in result["stream"]:
+            print(delta, end="", flush=True)
+        print()
+        metrics = result["metrics"]
+        if metrics.get("tokens_per_s"):
+            print(
+                f"\n⏱️ First token: {metrics['ttft_ms'] / 1000:.2f}s | "
+                f"{metrics['tokens_per_s']:.1f} tok/s | {metrics['tokens']} tokens"
+            )
     except Exception as e:
         print(f"\n❌ Error: {e}")
         if "api_key" in str(e).lower():
@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+import argparse
+
+# Add src to python path so we can import repocopilot
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.repocopilot.indexer.crawler import RepositoryCrawler
+from src.repocopilot.indexer.parallel import ParallelParser
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark parse throughput vs. number of worker processes"
+    )
+    parser.add_argument("repo", type=str, help="Path to a (large) repository")
+    parser.add_argument(
+        "--workers",
+        type=str,
+        default="1,2,4,8",
+        help="Comma-separated worker counts to try",
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=16, help="Files per dispatched task"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Runs per worker count (best is kept)"
+    )
+
+    args = parser.parse_args()
+
+    crawler = RepositoryCrawler(args.repo)
+    rel_paths = [os.path.relpath(p, args.repo) for p in crawler.scan()]
+    total_bytes = sum(os.path.getsize(os.path.join(args.repo, p)) for p in rel_paths)
+    print(
+        f"📂 {len(rel_paths)} files, {total_bytes / 1024**2:.1f} MiB in {args.repo}\n"
+    )
+
+    baseline = None
+    print(f"{'workers':>8} {'seconds':>9} {'files/s':>9} {'chunks':>8} {'speedup':>8}")
+    for workers in [int(w) for w in args.workers.split(",")]:
+        best = float("inf")
+        chunks = 0
+        for _ in range(args.repeat):
+            parallel = ParallelParser(
+                args.repo, workers=workers, chunksize=args.chunksize
+            )
+            start = time.perf_counter()
+            chunks = sum(len(f.chunks) for f in parallel.iter_files(rel_paths))
+            best = min(best, time.perf_counter() - start)
+
+        baseline = baseline or best
+        print(
+            f"{workers:>8} {best:>9.2f} {len(rel_paths) / best:>9.0f} "
+            f"{chunks:>8} {baseline / best:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
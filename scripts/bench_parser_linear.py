@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import argparse
+
+# Add src to python path so we can import repocopilot
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.repocopilot.indexer.parser import CodeParser
+
+
+# Synthetic generated-code shapes: one class holding `n` small methods
+def make_python(n: int) -> str:
+    methods = "".join(
+        f"    def method_{i}(self, x):\n        y = x + {i}\n        return y * 2\n\n"
+        for i in range(n)
+    )
+    return f"class Generated:\n{methods}"
+
+
+def make_cpp(n: int) -> str:
+    methods = "".join(
+        f"  int method_{i}(int x) {{\n    int y = x + {i};\n    return y * 2;\n  }}\n"
+        for i in range(n)
+    )
+    functions = "".join(
+        f"int free_{i}(int x) {{\n  return x - {i};\n}}\n" for i in range(n)
+    )
+    return f"struct Generated {{\n{methods}}};\n{functions}"
+
+
+def make_typescript(n: int) -> str:
+    methods = "".join(
+        f"  method_{i}(x: number): number {{\n    const y = x + {i};\n    return y * 2;\n  }}\n"
+        for i in range(n)
+    )
+    return f"class Generated {{\n{methods}}}\n"
+
+
+GENERATORS = {
+    "gen.py": make_python,
+    "gen.cpp": make_cpp,
+    "gen.ts": make_typescript,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark CodeParser on synthetic large files"
+    )
+    parser.add_argument(
+        "--sizes",
+        type=str,
+        default="500,1000,2000,4000,8000",
+        help="Comma-separated numbers of functions per file",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per size (best is kept)"
+    )
+
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+    code_parser = CodeParser()
+
+    for file_name, generate in GENERATORS.items():
+        print(f"\n📄 {file_name}")
+        print(
+            f"{'funcs':>8} {'lines':>8} {'chunks':>8} {'ms':>9} {'µs/chunk':>9} {'growth':>7}"
+        )
+        previous = None
+        for n in sizes:
+            code = generate(n)
+            best = float("inf")
+            chunks = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                chunks = code_parser.extract_structures(code, file_name)
+                best = min(best, time.perf_counter() - start)
+
+            per_chunk = best / len(chunks) * 1e6
+            # Linear behavior keeps µs/chunk flat, i.e. growth ~1.0x per doubling
+            growth = f"{per_chunk / previous:.2f}x" if previous else "-"
+            previous = per_chunk
+            print(
+                f"{n:>8} {code.count(chr(10)):>8} {len(chunks):>8} "
+                f"{best * 1e3:>9.1f} {per_chunk:>9.1f} {growth:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
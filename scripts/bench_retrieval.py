@@ -0,0 +1,342 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import tarfile
+import argparse
+import platform
+import tempfile
+from typing import Any, Dict, List
+import numpy as np
+
+# Add src to python path so we can import repocopilot
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+
+from src.repocopilot.indexer.build import IndexBuilder
+from src.repocopilot.indexer.registry import repo_commit
+from src.repocopilot.retriever.engine import HybridRetriever
+
+DEFAULT_QUERIES = os.path.join(os.path.dirname(__file__), "bench_retrieval.json")
+
+# Scalar metrics compared against --baseline (path in the report, higher is better)
+HEADLINE = [
+    ("quality.hybrid.recall", True),
+    ("quality.hybrid.mrr", True),
+    ("quality.bm25.recall", True),
+    ("quality.vector.recall", True),
+    ("latency_ms.total.p50", False),
+    ("latency_ms.total.p95", False),
+    ("latency_ms.total.p99", False),
+    ("throughput_qps.sequential", True),
+    ("throughput_qps.batched", True),
+    ("memory_mb.peak_rss", False),
+]
+
+
+def checkout_corpus(commit: str, path: str) -> str:
+    """
+    Extracts `path` as of `commit` of this repository (git archive) into a temp
+    directory kept per commit, so every run and --index_dir see the same files.
+    """
+    import git
+
+    target = os.path.join(tempfile.gettempdir(), f"repocopilot-bench-{commit[:12]}")
+    if not os.path.isdir(target):
+        buffer = io.BytesIO()
+        git.Repo(ROOT).archive(buffer, commit, path=path)
+        buffer.seek(0)
+        staging = tempfile.mkdtemp(prefix="repocopilot-bench-")
+        with tarfile.open(fileobj=buffer) as tar:
+            tar.extractall(staging, filter="data")
+        try:
+            os.rename(staging, target)
+        except OSError:  # extracted concurrently by another run
+            shutil.rmtree(staging, ignore_errors=True)
+    return os.path.join(target, path)
+
+
+def is_relevant(chunk, labels: List[Dict[str, str]]) -> bool:
+    path = chunk.file_path.replace("\\", "/")
+    return any(
+        path == label["file"] and (not label.get("name") or chunk.name == label["name"])
+        for label in labels
+    )
+
+
+def quality(ranked: List[List[Any]], cases: List[Dict[str, Any]], top_k: int) -> Dict:
+    """Mean label recall@k and MRR of the first relevant result."""
+    recalls, reciprocal_ranks = [], []
+    for results, case in zip(ranked, cases):
+        labels = case["relevant"]
+        chunks = [r.chunk for r in results[:top_k]]
+        found = sum(any(is_relevant(c, [label]) for c in chunks) for label in labels)
+        recalls.append(found / len(labels))
+        rank = next((i for i, c in enumerate(chunks, 1) if is_relevant(c, labels)), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    return {
+        "recall": float(np.mean(recalls)),
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "per_query_recall": recalls,
+    }
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    return {
+        "p50": float(np.percentile(samples, 50)),
+        "p95": float(np.percentile(samples, 95)),
+        "p99": float(np.percentile(samples, 99)),
+        "mean": float(np.mean(samples)),
+    }
+
+
+def rss_mb(peak: bool = False) -> float:
+    """Current (from /proc) or peak resident memory of this process, in MiB."""
+    if not peak and os.path.exists("/proc/self/statm"):
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def dir_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, f))
+        for root, _, files in os.walk(path)
+        for f in files
+    )
+
+
+def fusion_notes(quality: Dict[str, Dict[str, float]], top_k: int) -> List[str]:
+    """Flags single legs that beat the fused ranking, which RRF is meant to avoid."""
+    hybrid = quality["hybrid"]["recall"]
+    return [
+        f"hybrid recall@{top_k} {hybrid:.3f} is below {leg}-only "
+        f"{quality[leg]['recall']:.3f}: RRF favours chunks both legs rank, so a "
+        f"weak other leg pushes out {leg}-only hits"
+        for leg in ("bm25", "vector")
+        if quality[leg]["recall"] > hybrid
+    ]
+
+
+def lookup(report: Dict, path: str):
+    for key in path.split("."):
+        report = report.get(key, {}) if isinstance(report, dict) else {}
+    return report if isinstance(report, (int, float)) else None
+
+
+def compare(report: Dict, baseline_path: str):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    commit = baseline.get("commit", "")[:8] or "unknown"
+    print(f"\n📊 Against {baseline_path} ({commit}):")
+    corpus = baseline.get("config", {}).get("corpus")
+    if corpus != report["config"]["corpus"]:
+        print(
+            f"  ⚠️ Baseline indexed a different corpus ({corpus}), "
+            "so quality is not comparable"
+        )
+    for path, higher_is_better in HEADLINE:
+        old, new = lookup(baseline, path), lookup(report, path)
+        if old is None or new is None:
+            continue
+        delta = new - old
+        better = delta > 0 if higher_is_better else delta < 0
+        mark = "✅" if better else ("➖" if abs(delta) < 1e-9 else "⚠️")
+        print(f"  {mark} {path:<28} {old:>10.3f} -> {new:>10.3f} ({delta:+.3f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Retrieval benchmark: indexes the corpus pinned in the query set (a fixed "
+            "commit) with deterministic offline embeddings, replays labelled queries and reports per-stage latency, "
+            "throughput, memory and recall@k/MRR as JSON"
+        )
+    )
+    parser.add_argument(
+        "--repo",
+        type=str,
+        default=None,
+        help="Directory to index instead of the corpus pinned in the query set",
+    )
+    parser.add_argument(
+        "--queries", type=str, default=DEFAULT_QUERIES, help="Labelled query set (JSON)"
+    )
+    parser.add_argument("--top_k", type=int, default=10, help="Results per query")
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Timed passes over the query set"
+    )
+    parser.add_argument(
+        "--backend", type=str, default=None, help="Vector backend: qdrant or numpy"
+    )
+    parser.add_argument(
+        "--embedding",
+        type=str,
+        default="hashing",
+        choices=["hashing", "mock"],
+        help="Offline embeddings: hashed code features or seeded random vectors",
+    )
+    parser.add_argument(
+        "--index_dir",
+        type=str,
+        default=None,
+        help="Keep the index here and update it incrementally (default: temporary)",
+    )
+    parser.add_argument(
+        "--output", type=str, default=None, help="Write the JSON report to this file"
+    )
+    parser.add_argument(
+        "--baseline", type=str, default=None, help="Earlier JSON report to compare with"
+    )
+
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        query_set = json.load(f)
+    cases = query_set["queries"]
+    queries = [case["query"] for case in cases]
+
+    # The labels describe a fixed commit; the work tree moves with every change
+    if args.repo:
+        repo, corpus = args.repo, os.path.abspath(args.repo)
+    else:
+        pinned = query_set["corpus"]
+        repo = checkout_corpus(pinned["commit"], pinned["path"])
+        corpus = f"{pinned['path']}@{pinned['commit'][:12]}"
+
+    index_dir = args.index_dir or tempfile.mkdtemp(prefix="bench-retrieval-")
+    try:
+        # 1. Index (both offline embeddings are deterministic, so runs are comparable)
+        start = time.perf_counter()
+        builder = IndexBuilder(
+            repo_path=repo,
+            output_dir=index_dir,
+            provider=args.embedding,
+            vector_backend=args.backend,
+        )
+        builder.build()
+        build_s = time.perf_counter() - start
+
+        rss_before = rss_mb()
+        start = time.perf_counter()
+        retriever = HybridRetriever(
+            bm25_path=os.path.join(index_dir, "bm25.pkl"),
+            qdrant_path=os.path.join(index_dir, "qdrant"),
+            embedding_service=builder.embedding_service,
+            cache_size=0,  # measure retrieval, not the query cache
+        )
+        open_ms = (time.perf_counter() - start) * 1000
+        rss_open = rss_mb()
+
+        # 2. Quality per leg and fused
+        print(f"\n🔍 Replaying {len(queries)} queries x {args.repeat}...")
+        ranked = {
+            "bm25": [retriever.bm25.search(q, args.top_k) for q in queries],
+            "vector": [retriever.vector.search(q, args.top_k) for q in queries],
+            "hybrid": [retriever.search(q, top_k=args.top_k) for q in queries],
+        }  # also the warm-up pass
+        scores = {name: quality(r, cases, args.top_k) for name, r in ranked.items()}
+
+        # 3. Latency per stage (ms, from HybridRetriever.last_timings)
+        stages: Dict[str, List[float]] = {}
+        for _ in range(args.repeat):
+            for query in queries:
+                retriever.search(query, top_k=args.top_k)
+                for stage, ms in retriever.last_timings.items():
+                    stages.setdefault(stage, []).append(ms)
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            retriever.search_many(queries, top_k=args.top_k)
+        batched_s = time.perf_counter() - start
+        sequential_s = sum(stages["total"]) / 1000
+        retriever.close()
+
+        report = {
+            "commit": repo_commit(ROOT) or "",
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": {
+                "corpus": corpus,
+                "queries": os.path.basename(args.queries),
+                "n_queries": len(queries),
+                "top_k": args.top_k,
+                "repeat": args.repeat,
+                "vector_backend": builder.vector_backend,
+                "embedding": builder.embedding_service.model,
+                "python": platform.python_version(),
+                "cpus": os.cpu_count(),
+            },
+            "index": {
+                "chunks": len(retriever.bm25.chunks),
+                "build_s": build_s,
+                "open_ms": open_ms,
+                "disk_mb": dir_size(index_dir) / 1024**2,
+            },
+            "latency_ms": {stage: percentiles(ms) for stage, ms in stages.items()},
+            "throughput_qps": {
+                "sequential": len(stages["total"]) / sequential_s,
+                "batched": len(queries) * args.repeat / batched_s,
+            },
+            "memory_mb": {
+                "index_open": rss_open - rss_before,
+                "rss": rss_mb(),
+                "peak_rss": rss_mb(peak=True),
+            },
+            "quality": {
+                name: {"recall": s["recall"], "mrr": s["mrr"]}
+                for name, s in scores.items()
+            },
+            "notes": [],
+            "queries": [
+                {
+                    "query": query,
+                    **{
+                        f"recall_{name}": s["per_query_recall"][i]
+                        for name, s in scores.items()
+                    },
+                }
+                for i, query in enumerate(queries)
+            ],
+        }
+    finally:
+        if not args.index_dir:
+            shutil.rmtree(index_dir, ignore_errors=True)
+
+    report["notes"] = fusion_notes(report["quality"], args.top_k)
+
+    # 4. Summary
+    print(
+        f"\n📦 {report['index']['chunks']} chunks, built in {build_s:.1f}s, "
+        f"opened in {open_ms:.1f}ms, {report['index']['disk_mb']:.1f} MiB on disk"
+    )
+    print(f"{'stage':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for stage, p in report["latency_ms"].items():
+        print(f"{stage:>8} {p['p50']:>8.2f} {p['p95']:>8.2f} {p['p99']:>8.2f}")
+    qps = report["throughput_qps"]
+    print(f"⚡ {qps['sequential']:.0f} q/s sequential, {qps['batched']:.0f} q/s batched")
+    print(
+        f"🧠 RSS {report['memory_mb']['rss']:.0f} MiB "
+        f"(index +{report['memory_mb']['index_open']:.0f}), "
+        f"peak {report['memory_mb']['peak_rss']:.0f} MiB"
+    )
+    for name, q in report["quality"].items():
+        print(f"🎯 {name:>6}: recall@{args.top_k} {q['recall']:.3f}, MRR {q['mrr']:.3f}")
+    for note in report["notes"]:
+        print(f"⚠️ {note}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report saved to {args.output}")
+    if args.baseline:
+        compare(report, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
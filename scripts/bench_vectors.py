@@ -0,0 +1,174 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+# Add src to python path so we can import repocopilot
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.repocopilot.retriever.vector_store import NumpyVectorStore, QdrantVectorStore
+
+# name -> NumpyVectorStore options (None: embedded Qdrant)
+CONFIGS = {
+    "qdrant": None,
+    "flat-f32": {"dtype": "float32", "index_type": "flat"},
+    "flat-f16": {"dtype": "float16", "index_type": "flat"},
+    "ivf": {"dtype": "float32", "index_type": "ivf"},
+    "hnsw": {"dtype": "float32", "index_type": "hnsw"},
+    # Quantized scans, rescored at full precision or (-codes) codes only
+    "int8": {"quantization": "int8"},
+    "int8-codes": {"quantization": "int8", "rescore": False},
+    "binary": {"quantization": "binary"},
+    "binary-codes": {"quantization": "binary", "rescore": False},
+    "ivf-int8": {"index_type": "ivf", "quantization": "int8"},
+}
+
+
+def clustered_vectors(n: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Embedding-like data: points scattered around random cluster centres."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    noise = rng.standard_normal((n, dim)).astype(np.float32)
+    return centres[labels] + 0.6 * noise
+
+
+def rss_bytes() -> int:
+    """Resident memory of this process, mapped index pages included (Linux only)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+def open_store(name: str, index_dir: str, dim: int, args):
+    options = CONFIGS[name]
+    if options is None:
+        return QdrantVectorStore(os.path.join(index_dir, "qdrant"), vector_size=dim)
+    return NumpyVectorStore(
+        index_dir,
+        vector_size=dim,
+        ann_min_size=1,
+        nprobe=args.nprobe,
+        rescore_factor=args.rescore_factor,
+        **{"index_type": "flat", "quantization": "none", **options},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Benchmark vector backends and quantization: build/open time, latency, "
+            "resident memory, disk size and recall@k"
+        )
+    )
+    parser.add_argument("--n", type=int, default=20000, help="Number of vectors")
+    parser.add_argument("--dim", type=int, default=384, help="Vector dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--top_k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument(
+        "--backends",
+        type=str,
+        default="qdrant,flat-f32,flat-f16,ivf,hnsw,int8,int8-codes,binary,binary-codes",
+        help=f"Comma-separated subset of: {', '.join(CONFIGS)}",
+    )
+    parser.add_argument(
+        "--nprobe", type=int, default=0, help="IVF lists scanned per query (0 = auto)"
+    )
+    parser.add_argument(
+        "--rescore_factor",
+        type=int,
+        default=0,
+        help="Candidates rescored per hit for quantized stores (0 = default)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    data = clustered_vectors(args.n, args.dim, clusters=64, seed=args.seed)
+    queries = clustered_vectors(args.queries, args.dim, clusters=64, seed=args.seed + 1)
+    ids = [f"chunk-{i}" for i in range(args.n)]
+
+    # Ground truth: exact cosine neighbours
+    unit = data / np.linalg.norm(data, axis=1, keepdims=True)
+    q_unit = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = np.argsort(-(q_unit @ unit.T), axis=1)[:, : args.top_k]
+    truth_ids = [{ids[i] for i in row} for row in truth]
+
+    print(
+        f"📐 {args.n} vectors x {args.dim} dims, {args.queries} queries, "
+        f"recall@{args.top_k} vs. exact search\n"
+    )
+    # scan MiB: data a full scan reads (codes when quantized); Qdrant local keeps
+    # its own float32 copy in memory. rss MiB: resident growth from opening the
+    # store to the end of its queries (mapped pages that were actually read)
+    print(
+        f"{'backend':>12} {'build s':>8} {'open ms':>8} {'p50 ms':>7} {'p95 ms':>7} "
+        f"{'batch q/s':>10} {'recall':>7} {'scan MiB':>9} {'rss MiB':>8} "
+        f"{'disk MiB':>9}"
+    )
+    for name in args.backends.split(","):
+        index_dir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+        try:
+            start = time.perf_counter()
+            try:
+                store = open_store(name, index_dir, args.dim, args)
+                for i in range(0, args.n, 1000):
+                    batch = ids[i : i + 1000]
+                    payloads = [{"chunk_id": cid} for cid in batch]
+                    store.upsert(batch, data[i : i + 1000].tolist(), payloads)
+                store.save()
+                store.close()
+            except ImportError as e:
+                print(f"{name:>12} skipped: {e}")
+                continue
+            build_s = time.perf_counter() - start
+
+            rss_before = rss_bytes()
+            start = time.perf_counter()
+            store = open_store(name, index_dir, None, args)
+            open_ms = (time.perf_counter() - start) * 1000
+
+            latencies, hits = [], []
+            for query in queries:
+                start = time.perf_counter()
+                hits.append(store.search(query[None, :], args.top_k)[0])
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            store.search(queries, args.top_k)
+            batch_qps = len(queries) / (time.perf_counter() - start)
+            resident = rss_bytes() - rss_before
+            if isinstance(store, NumpyVectorStore):
+                scan = store.scan_bytes()
+            else:
+                scan = args.n * args.dim * 4
+            store.close()
+
+            recall = np.mean(
+                [
+                    len({cid for cid, _, _ in found} & expected) / args.top_k
+                    for found, expected in zip(hits, truth_ids)
+                ]
+            )
+            disk = sum(
+                os.path.getsize(os.path.join(root, f))
+                for root, _, files in os.walk(index_dir)
+                for f in files
+            )
+            print(
+                f"{name:>12} {build_s:>8.2f} {open_ms:>8.1f} "
+                f"{np.percentile(latencies, 50):>7.2f} {np.percentile(latencies, 95):>7.2f} "
+                f"{batch_qps:>10.0f} {recall:>7.3f} {scan / 1024**2:>9.1f} "
+                f"{resident / 1024**2:>8.1f} {disk / 1024**2:>9.1f}"
+            )
+        finally:
+            shutil.rmtree(index_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
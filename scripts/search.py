@@ -11,6 +11,12 @@ from src.repocopilot.retriever.engine import HybridRetriever
 def main():
     parser = argparse.ArgumentParser(description="RepoCopilot Search CLI")
     parser.add_argument("query", type=str, help="The search query")
+    parser.add_argument(
+        "--repo",
+        type=str,
+        default=".",
+        help="Repository whose published index to use (see data/indexes)",
+    )
     parser.add_argument(
         "--top_k", type=int, default=5, help="Number of results to return"
     )
@@ -24,15 +30,18 @@ def main():
 
     print(f"🔍 Searching for: '{args.query}'...")
 
-    # Initialize retriever
+    # Initialize retriever on the version the app currently serves
     # Note: Using mock embedding by default for testing
-    retriever = HybridRetriever(
-        bm25_path="data/bm25.pkl",
-        qdrant_path="data/qdrant",
-        use_mock_embedding=not args.use_real_embedding,
+    retriever = HybridRetriever.for_repo(
+        args.repo, use_mock_embedding=not args.use_real_embedding
     )
 
     results = retriever.search(args.query, top_k=args.top_k)
+    timings = retriever.last_timings
+    print(
+        "⏱️ "
+        + " | ".join(f"{name}: {ms:.1f}ms" for name, ms in timings.items())
+    )
 
     if not results:
         print("❌ No results found.")
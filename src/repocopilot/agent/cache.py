@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+
+from ..common.schema import SearchResult
+from ..retriever.cache import normalize_query
+
+
+class AnswerCache:
+    """
+    Persistent answers (content + sources) keyed by index version and normalized question.
+    Questions can also be stored with their embedding, so a paraphrase whose cosine
+    similarity to a cached question is above the threshold reuses that answer.
+    """
+
+    def __init__(
+        self,
+        path: str = "data/answer_cache.db",
+        max_entries: int = 5000,
+        similarity_threshold: float = 0.95,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        # index version -> (row ids, normalized question matrix) for similarity lookups
+        self._vectors: Dict[str, tuple] = {}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "version TEXT NOT NULL, question TEXT NOT NULL, "
+            "content TEXT NOT NULL, sources TEXT NOT NULL, embedding BLOB, "
+            "last_access REAL NOT NULL, UNIQUE (version, question))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_answers_access ON answers (last_access)"
+        )
+        self._conn.commit()
+
+    def lookup(
+        self,
+        version: str,
+        question: str,
+        embed: Callable[[], Optional[List[float]]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Cached answer for `question`: the normalized question itself, else (with
+        `embed`) the most similar cached question. `embed` returns the question's
+        embedding and is only called on an exact miss. Counts one hit, semantic hit
+        or miss per call.
+        """
+        hit = self.get(version, question)
+        semantic = False
+        if hit is None and embed is not None:
+            embedding = embed()
+            if embedding is not None:
+                hit = self.find_similar(version, embedding)
+                semantic = hit is not None
+        with self._lock:
+            if hit is None:
+                self.misses += 1
+            elif semantic:
+                self.semantic_hits += 1
+            else:
+                self.hits += 1
+        return hit
+
+    def get(self, version: str, question: str) -> Optional[Dict[str, Any]]:
+        """Exact lookup of the normalized question (not counted in `stats`)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, content, sources FROM answers WHERE version = ? AND question = ?",
+                (version, normalize_query(question)),
+            ).fetchone()
+            return None if row is None else self._hit(*row)
+
+    def find_similar(
+        self, version: str, embedding: List[float]
+    ) -> Optional[Dict[str, Any]]:
+        """Best cached answer whose question embedding is above the similarity threshold."""
+        with self._lock:
+            ids, matrix = self._load_vectors(version)
+            query = _unit(embedding)
+            if not len(ids) or matrix.shape[1] != len(query):
+                return None
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                return None
+            row = self._conn.execute(
+                "SELECT id, content, sources FROM answers WHERE id = ?", (int(ids[best]),)
+            ).fetchone()
+            if row is None:
+                return None
+            return {**self._hit(*row), "similarity": float(scores[best])}
+
+    def put(
+        self,
+        version: str,
+        question: str,
+        content: str,
+        sources: List[SearchResult],
+        embedding: List[float] = None,
+    ):
+        blob = None if embedding is None else _unit(embedding).tobytes()
+        payload = json.dumps([s.model_dump(mode="json") for s in sources], ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers "
+                "(version, question, content, sources, embedding, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (version, normalize_query(question), content, payload, blob, time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+            self._vectors.pop(version, None)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _hit(self, row_id: int, content: str, sources: str) -> Dict[str, Any]:
+        self._conn.execute(
+            "UPDATE answers SET last_access = ? WHERE id = ?", (time.time(), row_id)
+        )
+        self._conn.commit()
+        return {
+            "content": content,
+            "sources": [SearchResult(**s) for s in json.loads(sources)],
+        }
+
+    def _load_vectors(self, version: str) -> tuple:
+        if version not in self._vectors:
+            rows = self._conn.execute(
+                "SELECT id, embedding FROM answers WHERE version = ? AND embedding IS NOT NULL",
+                (version,),
+            ).fetchall()
+            ids = np.array([r[0] for r in rows], dtype=np.int64)
+            matrix = (
+                np.stack([np.frombuffer(r[1], dtype=np.float32) for r in rows])
+                if rows
+                else np.zeros((0, 0), dtype=np.float32)
+            )
+            self._vectors[version] = (ids, matrix)
+        return self._vectors[version]
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+        if count <= self.max_entries:
+            return
+        self._conn.execute(
+            "DELETE FROM answers WHERE id IN "
+            "(SELECT id FROM answers ORDER BY last_access ASC LIMIT ?)",
+            (count - self.max_entries,),
+        )
+        self._vectors.clear()
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
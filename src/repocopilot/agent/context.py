@@ -0,0 +1,175 @@
+import os
+import re
+import copy
+from typing import Callable, Dict, List, Optional, Set
+
+from ..common.schema import SearchResult
+from ..common.tokens import estimate_tokens
+
+
+def get_token_counter(model: str = None) -> Callable[[str], int]:
+    """
+    tiktoken counter for `model` (cl100k_base for unknown models such as Gemini).
+    Falls back to the 4-chars-per-token estimate if the encoding cannot be loaded,
+    e.g. offline on first use.
+    """
+    try:
+        import tiktoken
+
+        try:
+            encoding = tiktoken.encoding_for_model(model or "")
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception as e:
+        print(f"⚠️ tiktoken unavailable ({e}), estimating token counts.")
+        return lambda text: estimate_tokens([text])
+
+
+class Snippet:
+    """A contiguous line range of one file, built from one or more retrieved chunks."""
+
+    def __init__(self, result: SearchResult):
+        chunk = result.chunk
+        self.file_path = chunk.file_path
+        self.start_line = chunk.start_line
+        self.end_line = chunk.end_line
+        self.type = chunk.type.value if hasattr(chunk.type, "value") else chunk.type
+        self.lines = chunk.content.splitlines()
+        self.score = result.score
+
+    def merge(self, other: "Snippet"):
+        """Extends this snippet with the lines of an overlapping/adjacent one."""
+        if other.end_line > self.end_line:
+            skip = self.end_line - other.start_line + 1
+            self.lines.extend(other.lines[max(skip, 0) :])
+            self.end_line = other.end_line
+        if other.type != self.type:
+            self.type = "block"
+        self.score = max(self.score, other.score)
+
+
+class ContextPacker:
+    """
+    Turns retrieved chunks into a prompt context that fits a token budget:
+    - overlapping or adjacent chunks of the same file are merged (a class and its
+      methods, or the same chunk found by several retries, are sent once)
+    - snippets are added in order of fused score until the budget is used
+    - snippets larger than `max_snippet_tokens` (or than the remaining budget) are
+      trimmed to the line windows that mention the most query terms
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = None,
+        max_snippet_tokens: int = None,
+        window_lines: int = 20,
+        count_tokens: Callable[[str], int] = None,
+    ):
+        self.max_tokens = max_tokens or int(os.getenv("CONTEXT_TOKEN_BUDGET", 8000))
+        self.max_snippet_tokens = max_snippet_tokens or int(
+            os.getenv("CONTEXT_SNIPPET_TOKENS", 1500)
+        )
+        self.window_lines = window_lines
+        self.count_tokens = count_tokens or get_token_counter()
+        # Snippets that would have to be cut below this are skipped instead
+        self.min_snippet_tokens = 100
+
+    def build(self, query: str, results: List[SearchResult]) -> str:
+        terms = set(_terms(query))
+        snippets = sorted(self._merge(results), key=lambda s: s.score, reverse=True)
+
+        budget = self.max_tokens - self.count_tokens(_HEADER + _FOOTER)
+        parts = []
+        for snippet in snippets:
+            limit = min(self.max_snippet_tokens, budget)
+            if limit < self.min_snippet_tokens:
+                break
+            text = self._render(len(parts) + 1, snippet)
+            cost = self.count_tokens(text)
+            if cost > limit:
+                text = self._render(len(parts) + 1, self._trim(snippet, terms, limit))
+                cost = self.count_tokens(text)
+                if cost > limit:
+                    continue
+            parts.append(text)
+            budget -= cost
+
+        return "\n\n".join([_HEADER, *parts, _FOOTER])
+
+    def _merge(self, results: List[SearchResult]) -> List[Snippet]:
+        by_file: Dict[str, List[Snippet]] = {}
+        for result in results:
+            by_file.setdefault(result.chunk.file_path, []).append(Snippet(result))
+
+        merged = []
+        for snippets in by_file.values():
+            snippets.sort(key=lambda s: (s.start_line, -s.end_line))
+            current = snippets[0]
+            for snippet in snippets[1:]:
+                if snippet.start_line <= current.end_line + 1:
+                    current.merge(snippet)
+                else:
+                    merged.append(current)
+                    current = snippet
+            merged.append(current)
+        return merged
+
+    def _trim(self, snippet: Snippet, terms: Set[str], limit: int) -> Snippet:
+        """Keeps the first window (signature) plus the windows with the most query terms."""
+        n = self.window_lines
+        windows = [
+            (i, snippet.lines[i : i + n]) for i in range(0, len(snippet.lines), n)
+        ]
+        ranked = sorted(
+            windows,
+            key=lambda w: (w[0] != 0, -sum(t in terms for t in _terms("\n".join(w[1]))), w[0]),
+        )
+
+        # Windows are counted separately (plus room for the joins and omission
+        # markers), so this is approximate; the caller re-checks the real size
+        header_cost = self.count_tokens(self._render(0, snippet, lines=[])) + 20
+        kept, used = [], header_cost
+        for start, lines in ranked:
+            cost = self.count_tokens("\n".join(lines)) + 15
+            if used + cost > limit:
+                continue
+            kept.append(start)
+            used += cost
+        if not kept:
+            return snippet
+        kept.sort()
+
+        trimmed = copy.copy(snippet)
+        trimmed.lines = []
+        expected = 0
+        for start in kept:
+            if start > expected:
+                trimmed.lines.append(
+                    f"... (lines {snippet.start_line + expected}-"
+                    f"{snippet.start_line + start - 1} omitted) ..."
+                )
+            trimmed.lines.extend(snippet.lines[start : start + n])
+            expected = start + n
+        if expected < len(snippet.lines):
+            trimmed.lines.append(
+                f"... (lines {snippet.start_line + expected}-{snippet.end_line} omitted) ..."
+            )
+        return trimmed
+
+    def _render(self, index: int, snippet: Snippet, lines: Optional[List[str]] = None) -> str:
+        content = "\n".join(snippet.lines if lines is None else lines)
+        return (
+            f"[Chunk {index}]\n"
+            f"File: {snippet.file_path} (Lines {snippet.start_line}-{snippet.end_line})\n"
+            f"Type: {snippet.type}\n"
+            f"Content:\n{content}\n"
+        )
+
+
+_HEADER = "--- Code Context ---"
+_FOOTER = "-------------------"
+
+
+def _terms(text: str) -> List[str]:
+    return [w.lower() for w in re.findall(r"\w+", text)]
@@ -1,36 +1,96 @@
-from typing import List, Dict, Any
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional
 from ..retriever.engine import HybridRetriever
 from ..common.schema import SearchResult
+from .cache import AnswerCache
+from .context import ContextPacker, get_token_counter
 from .llm import LLMClient
+from .speculative import Draft, referenced_symbols
 from .prompt import SYSTEM_PROMPT
 
 
 class RepoCopilotAgent:
     def __init__(
-        self, retriever: HybridRetriever, llm: LLMClient, max_retries: int = 2
+        self,
+        retriever: HybridRetriever,
+        llm: LLMClient,
+        max_retries: int = 2,
+        answer_cache: Optional[AnswerCache] = None,
+        semantic_cache: bool = None,
+        context_packer: Optional[ContextPacker] = None,
+        speculative_retrieval: bool = None,
+        optimistic_answer: bool = None,
     ):
         self.retriever = retriever
         self.llm = llm
         self.max_retries = max_retries
+        self.answer_cache = answer_cache
+        # Paraphrase lookups embed the question once; the vector search reuses it
+        # through the embedding cache.
+        if semantic_cache is None:
+            semantic_cache = os.getenv("ANSWER_CACHE_SEMANTIC", "1") != "0"
+        self.semantic_cache = semantic_cache
+        self.context_packer = context_packer or ContextPacker(
+            count_tokens=get_token_counter(llm.model)
+        )
+        self.last_metrics: Dict[str, float] = {}
 
-    def answer(self, query: str) -> Dict[str, Any]:
+        # Latency modes, both off by default:
+        # - speculative_retrieval: while the sufficiency check runs, look up the
+        #   definitions of symbols the retrieved code uses; added if another hop is needed
+        # - optimistic_answer: start generating the answer during the check and
+        #   keep it if the evidence is judged sufficient (costs tokens otherwise)
+        if speculative_retrieval is None:
+            speculative_retrieval = os.getenv("AGENT_SPECULATIVE_RETRIEVAL", "0") == "1"
+        if optimistic_answer is None:
+            optimistic_answer = os.getenv("AGENT_OPTIMISTIC_ANSWER", "0") == "1"
+        self.speculative_retrieval = speculative_retrieval
+        self.optimistic_answer = optimistic_answer
+        self._pool = ThreadPoolExecutor(max_workers=6, thread_name_prefix="agent")
+
+    def answer(self, query: str, stream: bool = False) -> Dict[str, Any]:
         """
         Agentic RAG pipeline: Retrieve -> Evaluate -> (Optional Re-retrieve) -> Generate
         Returns:
             Dict: {
                 "content": str,   # The LLM's answer
                 "sources": List[SearchResult] # The code chunks used
+                "cached": bool    # True if served from the answer cache
+                "metrics": Dict   # ttft_ms, total_ms, tokens, tokens_per_s
             }
+        With `stream=True`, "content" is replaced by "stream", an iterator of text
+        deltas; "metrics" is filled in once the stream has been consumed.
         """
+        start = time.perf_counter()
+        self.last_metrics = metrics = {}
+
+        cached = self._cached_answer(query)
+        if cached is not None:
+            metrics.update(ttft_ms=(time.perf_counter() - start) * 1000)
+            metrics["total_ms"] = metrics["ttft_ms"]
+            cached["metrics"] = metrics
+            if stream:
+                cached["stream"] = iter([cached.pop("content")])
+            return cached
+
         all_results: List[SearchResult] = []
         current_query = query
+        draft: Optional[Draft] = None
+        next_results: Optional[List[SearchResult]] = None
 
         for attempt in range(self.max_retries + 1):
-            print(
-                f"🕵️ Attempt {attempt + 1}: Retrieving context for '{current_query}'..."
-            )
-            # Increase top_k to 10 to capture more definition chunks, not just usage
-            new_results = self.retriever.search(current_query, top_k=10)
+            if next_results is not None:
+                # The missing symbols were resolved from the symbol index
+                new_results, next_results = next_results, None
+            else:
+                print(
+                    f"🕵️ Attempt {attempt + 1}: Retrieving context for '{current_query}'..."
+                )
+                # Increase top_k to 10 to capture more definition chunks, not just usage
+                new_results = self.retriever.search(current_query, top_k=10)
 
             # Log retrieved files for debugging
             found_files = {res.chunk.file_path for res in new_results}
@@ -39,34 +99,61 @@ class RepoCopilotAgent:
             )
 
             # Merge results and avoid duplicates
-            seen_ids = {res.chunk.id for res in all_results}
-            for res in new_results:
-                if res.chunk.id not in seen_ids:
-                    all_results.append(res)
-                    seen_ids.add(res.chunk.id)
+            _merge_results(all_results, new_results)
 
             if not all_results:
-                return {
-                    "content": "I couldn't find any relevant code in the repository.",
-                    "sources": [],
-                }
+                text = "I couldn't find any relevant code in the repository."
+                result = {"sources": [], "cached": False, "metrics": metrics}
+                if stream:
+                    result["stream"] = iter([text])
+                else:
+                    result["content"] = text
+                return result
 
             # Build current context string
-            context_str = self._build_context(all_results)
+            context_str = self._build_context(query, all_results)
 
             # Check if we have enough info
             if attempt < self.max_retries:
                 print("🤔 Evaluating evidence sufficiency...")
-                eval_result = self.llm.evaluate_sufficiency(query, context_str)
+                verdict = self._pool.submit(
+                    self.llm.evaluate_sufficiency, query, context_str
+                )
+                lookups = (
+                    self._speculate(all_results) if self.speculative_retrieval else []
+                )
+                if self.optimistic_answer:
+                    draft = self._start_draft(query, context_str)
+                sufficient = False
+                try:
+                    eval_result = verdict.result()
 
-                if eval_result.get("sufficient"):
-                    print("✅ Evidence is sufficient.")
-                    break
-                else:
-                    missing = eval_result.get("missing_info", "Unknown")
-                    current_query = eval_result.get("suggested_query", query)
-                    print(f"⚠️ Insufficient evidence. Missing: {missing}")
-                    print(f"🔄 Retrying with optimized query: '{current_query}'")
+                    if eval_result.get("sufficient"):
+                        print("✅ Evidence is sufficient.")
+                        sufficient = True
+                        break
+                    else:
+                        for future in lookups:
+                            _merge_results(all_results, future.result())
+                        missing = eval_result.get("missing_info", "Unknown")
+                        current_query = eval_result.get("suggested_query", query)
+                        print(f"⚠️ Insufficient evidence. Missing: {missing}")
+                        next_results = self._missing_definitions(
+                            f"{missing} {current_query}", all_results
+                        )
+                        if next_results:
+                            print(
+                                f"📌 Found {len(next_results)} definitions in the symbol index, "
+                                "skipping the search."
+                            )
+                        else:
+                            next_results = None
+                            print(f"🔄 Retrying with optimized query: '{current_query}'")
+                finally:
+                    # Only an accepted draft may keep generating (and billing tokens)
+                    if draft is not None and not sufficient:
+                        draft.cancel()
+                        draft = None
             else:
                 print(
                     "⏳ Reached max retries. Generating answer with available context."
@@ -74,35 +161,172 @@ class RepoCopilotAgent:
 
         # Final Answer Generation
         print("🤖 Generating final answer...")
-        messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": f"Question: {query}\n\n{context_str}"},
-        ]
+        result = {"sources": all_results, "cached": False, "metrics": metrics}
+        deltas = self._generate(
+            query, _answer_messages(query, context_str), all_results, start, metrics, draft
+        )
+        if stream:
+            result["stream"] = deltas
+        else:
+            result["content"] = "".join(deltas)
+        return result
+
+    def _speculate(self, results: List[SearchResult]) -> list:
+        """Starts definition lookups for symbols used, but not defined, in `results`."""
+        symbols = referenced_symbols(results, known=(r.chunk.name for r in results))
+        if not symbols:
+            return []
+        print(f"🔮 Speculatively looking up: {', '.join(symbols)}")
+        return [self._pool.submit(self._lookup_definitions, symbols)]
+
+    def _missing_definitions(
+        self, text: str, known: List[SearchResult]
+    ) -> List[SearchResult]:
+        """Definitions of the symbols named in `text` that are not in `known` yet."""
+        seen = {r.chunk.id for r in known}
+        found = []
+        for name in _code_identifiers(text):
+            if name not in self.retriever.symbols:
+                continue
+            for res in self.retriever.find_definitions(name, limit=3):
+                if res.chunk.id not in seen:
+                    seen.add(res.chunk.id)
+                    found.append(res)
+        return found
+
+    def _lookup_definitions(self, names: List[str]) -> List[SearchResult]:
+        """Symbol-index hits first; names it does not know share one batched search."""
+        found, unknown = [], []
+        for name in names:
+            if name in self.retriever.symbols:
+                found.extend(self.retriever.find_definitions(name, limit=3))
+            else:
+                unknown.append(name)
+        if unknown:
+            try:
+                batches = self.retriever.search_many(unknown, top_k=5)
+            except Exception as e:
+                print(f"⚠️ Speculative lookup of {', '.join(unknown)} failed: {e}")
+                batches = []
+            for name, results in zip(unknown, batches):
+                found.extend(r for r in results if r.chunk.name == name)
+        return found
+
+    def _start_draft(self, query: str, context_str: str) -> Draft:
+        messages = _answer_messages(query, context_str)
+        return Draft(
+            self._pool, lambda stats: self.llm.chat_stream(messages, stats=stats)
+        )
+
+    def _generate(
+        self,
+        query: str,
+        messages: list,
+        sources: List[SearchResult],
+        start: float,
+        metrics: Dict[str, float],
+        draft: Optional[Draft] = None,
+    ) -> Iterator[str]:
+        """
+        Streams the final answer (continuing an optimistic draft if there is one),
+        then records timings and caches it.
+        """
+        if draft is not None:
+            stats, deltas = draft.stats, draft
+        else:
+            stats: Dict[str, Any] = {}
+            deltas = self.llm.chat_stream(messages, stats=stats)
+        parts = []
+        for delta in deltas:
+            if not parts:
+                # Time to first token as the user sees it, retrieval included
+                metrics["ttft_ms"] = (time.perf_counter() - start) * 1000
+            parts.append(delta)
+            yield delta
+
+        answer_text = "".join(parts)
+        metrics.update(
+            total_ms=(time.perf_counter() - start) * 1000,
+            tokens=stats.get("tokens", 0),
+            tokens_per_s=stats.get("tokens_per_s", 0.0),
+        )
+        print(
+            f"⏱️ First token after {metrics.get('ttft_ms', 0) / 1000:.2f}s, "
+            f"{metrics['tokens_per_s']:.1f} tok/s"
+        )
+
+        if self.answer_cache is not None:
+            self.answer_cache.put(
+                self._cache_version(),
+                query,
+                answer_text,
+                sources,
+                embedding=self._question_embedding(query),
+            )
 
-        answer_text = self.llm.chat(messages)
+    def _cached_answer(self, query: str) -> Optional[Dict[str, Any]]:
+        if self.answer_cache is None:
+            return None
+        hit = self.answer_cache.lookup(
+            self._cache_version(), query, lambda: self._question_embedding(query)
+        )
+        if hit is None:
+            return None
+        print("⚡ Answer served from cache.")
+        return {**hit, "cached": True}
 
-        return {"content": answer_text, "sources": all_results}
+    def _cache_version(self) -> str:
+        # Answers depend on both the indexed code and the model that wrote them
+        return f"{self.retriever.index_key}:{self.llm.model}"
+
+    def _question_embedding(self, query: str) -> Optional[List[float]]:
+        if not self.semantic_cache:
+            return None
+        try:
+            return self.retriever.vector.embedding_service.get_embeddings([query])[0]
+        except Exception as e:
+            print(f"⚠️ Question embedding failed: {e}")
+            return None
 
     def close(self):
         """Release retriever resources."""
+        self._pool.shutdown(wait=False)
         if self.retriever:
             self.retriever.close()
 
-    def _build_context(self, results: List[SearchResult]) -> str:
+    def _build_context(self, query: str, results: List[SearchResult]) -> str:
         """
-        Format retrieved chunks into a single string for the LLM.
+        Format retrieved chunks into a single string for the LLM,
+        packed into the context token budget.
         """
-        context_parts = ["--- Code Context ---"]
-
-        for i, res in enumerate(results):
-            chunk = res.chunk
-            part = (
-                f"[Chunk {i + 1}]\n"
-                f"File: {chunk.file_path} (Lines {chunk.start_line}-{chunk.end_line})\n"
-                f"Type: {chunk.type}\n"
-                f"Content:\n{chunk.content}\n"
-            )
-            context_parts.append(part)
+        return self.context_packer.build(query, results)
+
+
+def _answer_messages(query: str, context_str: str) -> list:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Question: {query}\n\n{context_str}"},
+    ]
+
+
+def _merge_results(all_results: List[SearchResult], new_results: List[SearchResult]):
+    """Appends the results whose chunk is not in `all_results` yet."""
+    seen_ids = {res.chunk.id for res in all_results}
+    for res in new_results:
+        if res.chunk.id not in seen_ids:
+            all_results.append(res)
+            seen_ids.add(res.chunk.id)
+
 
-        context_parts.append("-------------------")
-        return "\n\n".join(context_parts)
+def _code_identifiers(text: str) -> List[str]:
+    """
+    Identifiers quoted in backticks or shaped like code (snake_case, camelCase,
+    Class.method), so plain English words in the LLM's reasoning are not looked up.
+    """
+    quoted = re.findall(r"`([A-Za-z_][\w.]*)`", text)
+    shaped = [
+        word
+        for word in re.findall(r"[A-Za-z_][\w.]*\w", text)
+        if "_" in word or "." in word or re.search(r"[a-z][A-Z]|[A-Z].*[A-Z]", word)
+    ]
+    return list(dict.fromkeys(quoted + shaped))
@@ -1,8 +1,10 @@
 import os
 import json
-from typing import Dict, Any, Optional
-from openai import OpenAI
+import time
+from typing import Dict, Any, Iterator, Optional
+from openai import OpenAI, BadRequestError, UnprocessableEntityError
 from .prompt import SUFFICIENCY_PROMPT
+from ..common.tokens import estimate_tokens
 
 
 class LLMClient:
@@ -20,6 +22,8 @@ class LLMClient:
         self.model = model or os.getenv("MODEL_NAME")
         if not self.model:
             raise ValueError("MODEL_NAME is not set. Please check your .env file.")
+        # Cleared once the provider rejects `stream_options` (older compatible APIs)
+        self.stream_usage = True
 
     def chat(self, messages: list) -> str:
         """
@@ -30,6 +34,71 @@ class LLMClient:
         )
         return response.choices[0].message.content
 
+    def chat_stream(self, messages: list, stats: Dict[str, Any] = None) -> Iterator[str]:
+        """
+        Streaming chat completion, yields text deltas as they arrive.
+        If `stats` is given it is filled in when the stream ends with
+        first_token_ms, total_ms, tokens and tokens_per_s.
+        """
+        start = time.perf_counter()
+        response = self._create_stream(messages)
+
+        first_token = None
+        usage = None
+        parts = []
+        try:
+            for chunk in response:
+                # With include_usage the last chunk carries the usage (and no choices)
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter()
+                parts.append(delta)
+                yield delta
+        finally:
+            # Closing the generator early (e.g. a discarded draft) ends the HTTP stream
+            response.close()
+
+        if stats is not None:
+            end = time.perf_counter()
+            tokens = (
+                usage.completion_tokens
+                if usage is not None and usage.completion_tokens
+                else estimate_tokens(["".join(parts)])
+            )
+            generation = end - (first_token or end)
+            stats.update(
+                first_token_ms=((first_token or end) - start) * 1000,
+                total_ms=(end - start) * 1000,
+                tokens=tokens,
+                tokens_per_s=tokens / generation if generation > 0 else 0.0,
+            )
+
+    def _create_stream(self, messages: list):
+        """Opens a completion stream, asking for token usage where the provider allows it."""
+        if self.stream_usage:
+            try:
+                return self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.0,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+            except (BadRequestError, UnprocessableEntityError) as e:
+                if "stream_options" not in str(e):
+                    raise
+                print("⚠️ Provider rejected stream_options, estimating token counts.")
+                self.stream_usage = False
+        return self.client.chat.completions.create(
+            model=self.model, messages=messages, temperature=0.0, stream=True
+        )
+
     def evaluate_sufficiency(self, query: str, context: str) -> Dict[str, Any]:
         """
         Check if the retrieved context is sufficient to answer the query.
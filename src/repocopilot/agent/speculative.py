@@ -0,0 +1,82 @@
+import re
+import queue
+import keyword
+import builtins
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+from ..common.schema import SearchResult
+
+# Calls (`foo(`, `self.foo(`) and CamelCase type references
+_CALL = re.compile(r"\b([A-Za-z_]\w{2,})\s*\(")
+_TYPE = re.compile(r"\b([A-Z][a-z0-9]+[A-Z]\w*)\b")
+_IGNORED = frozenset(keyword.kwlist) | frozenset(dir(builtins)) | {"self", "cls", "super"}
+
+
+def referenced_symbols(
+    results: Iterable[SearchResult], known: Iterable[str] = (), limit: int = 3
+) -> List[str]:
+    """
+    Most frequently used identifiers in the retrieved code that are not defined
+    by any retrieved chunk, i.e. the likely "next hop" definition lookups.
+    """
+    defined = {name for name in known if name}
+    counts: Counter = Counter()
+    for res in results:
+        content = res.chunk.content
+        counts.update(_CALL.findall(content))
+        counts.update(_TYPE.findall(content))
+    candidates = [
+        name
+        for name, _ in counts.most_common()
+        if name not in defined and name not in _IGNORED
+    ]
+    return candidates[:limit]
+
+
+class Draft:
+    """
+    A final answer generated in the background while the sufficiency check is
+    still running. Deltas are buffered until the draft is either consumed
+    (verdict: sufficient) or cancelled (verdict: needs another hop).
+    """
+
+    _DONE = object()
+
+    def __init__(
+        self,
+        pool: ThreadPoolExecutor,
+        make_stream: Callable[[Dict[str, Any]], Iterator[str]],
+    ):
+        self.stats: Dict[str, Any] = {}
+        self._queue: "queue.Queue" = queue.Queue()
+        self._cancelled = threading.Event()
+        self._future = pool.submit(self._run, make_stream)
+
+    def _run(self, make_stream):
+        try:
+            stream = make_stream(self.stats)
+            try:
+                for delta in stream:
+                    if self._cancelled.is_set():
+                        break
+                    self._queue.put(delta)
+            finally:
+                stream.close()
+        except Exception as e:
+            self._queue.put(e)
+        self._queue.put(self._DONE)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            item = self._queue.get()
+            if item is self._DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
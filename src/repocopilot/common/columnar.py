@@ -0,0 +1,334 @@
+import os
+import json
+import mmap
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple, Any
+import numpy as np
+
+from .schema import BaseChunkView, CodeChunk, ChunkType
+
+# File layout: MAGIC | u64 header length | JSON header | 64-byte aligned raw arrays
+MAGIC = b"RCIDX001"
+ALIGN = 64
+
+_CHUNK_TYPES = list(ChunkType)
+
+
+def write_arrays(path: str, arrays: Dict[str, np.ndarray], header: Dict[str, Any]):
+    """
+    Writes named arrays plus a JSON header into one file.
+    The file is written next to `path` and renamed over it, so readers never see a partial index.
+    """
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        layout[name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+        }
+        offset += _aligned(array.nbytes)
+
+    header_bytes = json.dumps(
+        {**header, "arrays": layout}, ensure_ascii=False
+    ).encode("utf-8")
+    data_start = _aligned(len(MAGIC) + 8 + len(header_bytes))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * (data_start - f.tell()))
+        for name, array in arrays.items():
+            f.write(array.tobytes())
+            f.write(b"\0" * (_aligned(array.nbytes) - array.nbytes))
+    os.replace(tmp_path, path)
+
+
+def read_arrays(
+    path: str, use_mmap: bool = True
+) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """
+    Reads a file produced by `write_arrays`.
+    With `use_mmap` the arrays are zero-copy views of a read-only memory map,
+    so opening is O(header) and pages are only read when touched.
+    """
+    with open(path, "rb") as f:
+        if use_mmap:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buffer = f.read()
+
+    if buffer[: len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a RepoCopilot index file")
+    (header_len,) = struct.unpack_from("<Q", buffer, len(MAGIC))
+    header_start = len(MAGIC) + 8
+    header = json.loads(bytes(buffer[header_start : header_start + header_len]))
+    data_start = _aligned(header_start + header_len)
+
+    arrays = {}
+    for name, spec in header.pop("arrays").items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"])) if spec["shape"] else 1
+        arrays[name] = np.frombuffer(
+            buffer, dtype=dtype, count=count, offset=data_start + spec["offset"]
+        ).reshape(spec["shape"])
+    return header, arrays
+
+
+def file_offset(array: np.ndarray) -> Optional[int]:
+    """Byte offset of an array returned by `read_arrays` in its file (None if not mapped)."""
+    base = array
+    while base is not None and not isinstance(base, mmap.mmap):
+        base = base.obj if isinstance(base, memoryview) else getattr(base, "base", None)
+    if base is None or not array.nbytes:
+        return None
+    mapped = np.frombuffer(base, dtype=np.uint8, count=1)
+    return array.ctypes.data - mapped.ctypes.data
+
+
+def _aligned(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+class StringColumn:
+    """Variable-length strings stored as one UTF-8 buffer plus offsets."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def pack(cls, values: Sequence[Optional[str]]) -> "StringColumn":
+        encoded = [(v or "").encode("utf-8") for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(blob, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.blob[start:end].tobytes().decode("utf-8")
+
+    def to_list(self) -> List[str]:
+        """Decodes every value (one buffer copy, then slicing)."""
+        data = self.blob.tobytes()
+        bounds = self.offsets.tolist()
+        return [
+            data[bounds[i] : bounds[i + 1]].decode("utf-8")
+            for i in range(len(bounds) - 1)
+        ]
+
+    def get_optional(self, i: int) -> Optional[str]:
+        # Empty strings round-trip as None (names are never empty)
+        return self[i] or None
+
+
+class ChunkTable(Sequence["ChunkView"]):
+    """
+    Chunk metadata in columnar arrays: interned file paths, int32 line numbers,
+    uint8 chunk types and contiguous string buffers. Indexing returns a `ChunkView`,
+    which decodes fields only when they are read.
+    """
+
+    def __init__(
+        self,
+        ids: StringColumn,
+        contents: StringColumn,
+        paths: List[str],
+        file_idx: np.ndarray,
+        start_line: np.ndarray,
+        end_line: np.ndarray,
+        types: np.ndarray,
+        names: StringColumn,
+        parents: StringColumn,
+        metadata: StringColumn,
+    ):
+        self.ids = ids
+        self.contents = contents
+        self.paths = paths
+        self.file_idx = file_idx
+        self.start_line = start_line
+        self.end_line = end_line
+        self.types = types
+        self.names = names
+        self.parents = parents
+        # One JSON document per row ("" if empty), decoded only when the row is read
+        self.metadata = metadata
+
+    @classmethod
+    def from_chunks(cls, chunks: Sequence[CodeChunk]) -> "ChunkTable":
+        path_ids: Dict[str, int] = {}
+        file_idx = np.empty(len(chunks), dtype=np.int32)
+        for i, c in enumerate(chunks):
+            file_idx[i] = path_ids.setdefault(c.file_path, len(path_ids))
+
+        return cls(
+            ids=StringColumn.pack([c.id for c in chunks]),
+            contents=StringColumn.pack([c.content for c in chunks]),
+            paths=list(path_ids),
+            file_idx=file_idx,
+            start_line=np.array([c.start_line for c in chunks], dtype=np.int32),
+            end_line=np.array([c.end_line for c in chunks], dtype=np.int32),
+            types=np.array(
+                [_CHUNK_TYPES.index(ChunkType(c.type)) for c in chunks], dtype=np.uint8
+            ),
+            names=StringColumn.pack([c.name for c in chunks]),
+            parents=StringColumn.pack([c.parent_name for c in chunks]),
+            metadata=StringColumn.pack(
+                [
+                    json.dumps(c.metadata, ensure_ascii=False) if c.metadata else ""
+                    for c in chunks
+                ]
+            ),
+        )
+
+    def to_arrays(self, prefix: str = "chunk.") -> Tuple[Dict, Dict[str, np.ndarray]]:
+        arrays = {
+            "file_idx": self.file_idx,
+            "start_line": self.start_line,
+            "end_line": self.end_line,
+            "types": self.types,
+        }
+        columns = {
+            "ids": self.ids,
+            "contents": self.contents,
+            "names": self.names,
+            "parents": self.parents,
+            "metadata": self.metadata,
+        }
+        for name, column in columns.items():
+            arrays[f"{name}.blob"] = column.blob
+            arrays[f"{name}.offsets"] = column.offsets
+        header = {"paths": self.paths}
+        return header, {prefix + k: v for k, v in arrays.items()}
+
+    @classmethod
+    def from_arrays(
+        cls, header: Dict, arrays: Dict[str, np.ndarray], prefix: str = "chunk."
+    ) -> "ChunkTable":
+        def column(name: str) -> StringColumn:
+            return StringColumn(
+                arrays[f"{prefix}{name}.blob"], arrays[f"{prefix}{name}.offsets"]
+            )
+
+        return cls(
+            ids=column("ids"),
+            contents=column("contents"),
+            paths=header["paths"],
+            file_idx=arrays[prefix + "file_idx"],
+            start_line=arrays[prefix + "start_line"],
+            end_line=arrays[prefix + "end_line"],
+            types=arrays[prefix + "types"],
+            names=column("names"),
+            parents=column("parents"),
+            metadata=column("metadata"),
+        )
+
+    def __len__(self) -> int:
+        return len(self.file_idx)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("chunk index out of range")
+        return ChunkView(self, i)
+
+    def __iter__(self):
+        return (ChunkView(self, i) for i in range(len(self)))
+
+    def file_path(self, i: int) -> str:
+        return self.paths[self.file_idx[i]]
+
+    def _metadata(self, i: int) -> Dict[str, Any]:
+        raw = self.metadata[i]
+        return json.loads(raw) if raw else {}
+
+
+class ChunkView(BaseChunkView):
+    """
+    Read-only row of a ChunkTable with the same attributes as `CodeChunk`.
+    Two slots instead of a pydantic model with a metadata dict; use `to_chunk()`
+    where a real `CodeChunk` is needed (e.g. serialization).
+    """
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table: ChunkTable, row: int):
+        self._table = table
+        self._row = row
+
+    @property
+    def id(self) -> str:
+        return self._table.ids[self._row]
+
+    @property
+    def content(self) -> str:
+        return self._table.contents[self._row]
+
+    @property
+    def file_path(self) -> str:
+        return self._table.file_path(self._row)
+
+    @property
+    def start_line(self) -> int:
+        return int(self._table.start_line[self._row])
+
+    @property
+    def end_line(self) -> int:
+        return int(self._table.end_line[self._row])
+
+    @property
+    def type(self) -> ChunkType:
+        return _CHUNK_TYPES[self._table.types[self._row]]
+
+    @property
+    def name(self) -> Optional[str]:
+        return self._table.names.get_optional(self._row)
+
+    @property
+    def parent_name(self) -> Optional[str]:
+        return self._table.parents.get_optional(self._row)
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self._table._metadata(self._row)
+
+    def to_chunk(self) -> CodeChunk:
+        # Values come from our own index file, so skip pydantic validation
+        return CodeChunk.model_construct(
+            id=self.id,
+            content=self.content,
+            file_path=self.file_path,
+            start_line=self.start_line,
+            end_line=self.end_line,
+            type=self.type,
+            name=self.name,
+            parent_name=self.parent_name,
+            metadata=self.metadata,
+        )
+
+    def model_dump(self, **kwargs) -> Dict[str, Any]:
+        return self.to_chunk().model_dump(**kwargs)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ChunkView):
+            return self._table is other._table and self._row == other._row
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((id(self._table), self._row))
+
+    def __repr__(self) -> str:
+        return f"ChunkView(id={self.id!r}, lines={self.start_line}-{self.end_line})"
+
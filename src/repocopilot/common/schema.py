@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field, field_serializer
+from typing import Optional, Dict, Any, Union
 from enum import Enum
 
 
@@ -29,7 +29,26 @@ class CodeChunk(BaseModel):
         frozen = True  # Make instances immutable
 
 
+class BaseChunkView:
+    """
+    Lazy, read-only stand-in for a `CodeChunk` with the same attributes
+    (implemented by `common.columnar.ChunkView`).
+    """
+
+    __slots__ = ()
+
+    def to_chunk(self) -> CodeChunk:
+        raise NotImplementedError
+
+
 class SearchResult(BaseModel):
-    chunk: CodeChunk
+    # Results read from an index hold lightweight chunk views instead of models
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    chunk: Union[CodeChunk, BaseChunkView]
     score: float
-    source: str = "vector"  # 'vector', 'bm25', or 'hybrid'
+    source: str = "vector"  # 'vector', 'bm25', 'hybrid' or 'symbol'
+
+    @field_serializer("chunk")
+    def _serialize_chunk(self, chunk):
+        return chunk.to_chunk() if isinstance(chunk, BaseChunkView) else chunk
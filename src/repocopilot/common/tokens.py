@@ -0,0 +1,6 @@
+from typing import List
+
+
+def estimate_tokens(texts: List[str]) -> int:
+    # Approx: 1 token ~ 4 chars
+    return sum(len(t) for t in texts) // 4 + 1
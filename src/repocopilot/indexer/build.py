@@ -1,16 +1,113 @@
 import os
-import uuid
-import hashlib
-from typing import List
+import queue
+import shutil
+import threading
+from typing import List, Optional, Iterable, Generator, TypeVar, Callable, Dict, Any
+import numpy as np
 from tqdm import tqdm
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
 
 from ..common.schema import CodeChunk
 from .crawler import RepositoryCrawler
-from .parser import CodeParser
+from .parallel import ParallelParser
 from .embeddings import get_embedding_service
-from ..retriever.bm25 import BM25Retriever
+from .manifest import IndexManifest, FileRecord, ManifestDiff
+from .gitdiff import diff_commits
+from .registry import IndexRegistry, repo_commit, repo_is_dirty
+from ..retriever.bm25 import BM25Retriever, index_file_path
+from ..retriever.symbols import SymbolIndex, SYMBOLS_FILE
+from ..retriever.vector_store import (
+    HNSW_FILE,
+    VECTORS_FILE,
+    open_vector_store,
+    vector_backend,
+)
+
+T = TypeVar("T")
+
+
+def _close(iterator):
+    """Closes a generator early, running its cleanup (e.g. shutting down a pool)."""
+    close = getattr(iterator, "close", None)
+    if close is not None:
+        close()
+
+
+def _batched(items: Iterable[T], size: int) -> Generator[List[T], None, None]:
+    iterator = iter(items)
+    try:
+        batch = []
+        for item in iterator:
+            batch.append(item)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        _close(iterator)
+
+
+def _prefetch(items: Iterable[T], depth: int = 2) -> Generator[T, None, None]:
+    """
+    Produces `items` on a background thread through a queue of at most `depth`
+    entries. The producer blocks when the consumer falls behind (backpressure).
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+    done = object()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except Exception as e:
+            put((done, e))
+        finally:
+            # On this thread: a generator cannot be closed while another one runs it
+            _close(iterator)
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item, error = q.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+        worker.join(timeout=1)
+
+
+class IndexingCancelled(Exception):
+    """Raised inside a build when its cancel_event is set."""
+
+
+def _resolve_commit(repo_path: str, rev: str) -> str:
+    import git
+
+    return git.Repo(repo_path, search_parent_directories=True).commit(rev).hexsha
+
+
+def _backend_name(backend: str = None) -> str:
+    backend = vector_backend(backend)
+    if backend not in ("qdrant", "numpy"):
+        raise ValueError(f"Unknown vector backend '{backend}' (use 'qdrant' or 'numpy').")
+    return backend
 
 
 class IndexBuilder:
@@ -22,10 +119,19 @@ class IndexBuilder:
         use_mock_embedding: bool = False,
         provider: str = None,
         ignore_dirs: List[str] = None,
+        parse_workers: int = None,
+        progress_callback: Callable[[Dict[str, Any]], None] = None,
+        cancel_event: threading.Event = None,
+        vector_backend: str = None,
+        quantization: str = None,
     ):
         self.repo_path = repo_path
         self.output_dir = output_dir
         self.collection_name = collection_name
+        # Optional hooks for background builds (see indexer.worker)
+        self.progress_callback = progress_callback
+        self.cancel_event = cancel_event
+        self.progress: Dict[str, Any] = {}
 
         # Ensure output dir exists
         os.makedirs(output_dir, exist_ok=True)
@@ -37,120 +143,314 @@ class IndexBuilder:
         # Get vector size by doing a dummy embedding
         dummy_vector = self.embedding_service.get_embeddings(["test"])[0]
         vector_size = len(dummy_vector)
+        self.vector_size = vector_size
         print(f"📡 Using Embedding Provider with vector size: {vector_size}")
 
         self.crawler = RepositoryCrawler(repo_path, ignore_dirs=ignore_dirs)
-        self.parser = CodeParser()
+        # Defaults to one worker per CPU; PARSE_WORKERS=1 parses in-process
+        self.parser = ParallelParser(
+            repo_path, workers=parse_workers or int(os.getenv("PARSE_WORKERS", 0))
+        )
 
-        # Initialize Qdrant (Persistent mode)
-        qdrant_path = os.path.join(output_dir, "qdrant")
-        self.client = QdrantClient(path=qdrant_path)
+        # Vector store: embedded Qdrant or the in-process NumPy matrix (VECTOR_BACKEND),
+        # optionally int8/binary quantized (VECTOR_QUANTIZATION)
+        self.vector_backend = _backend_name(vector_backend)
+        self.store = open_vector_store(
+            output_dir, vector_size, self.vector_backend, collection_name, quantization
+        )
 
-        # Check if collection exists, if not create
-        collections = self.client.get_collections().collections
-        exists = any(c.name == self.collection_name for c in collections)
+    @classmethod
+    def for_repo(
+        cls, repo_path: str, registry: IndexRegistry = None, **kwargs
+    ) -> "IndexBuilder":
+        """Builder writing into the repository's own directory of the index registry."""
+        registry = registry or IndexRegistry()
+        return cls(repo_path=repo_path, output_dir=registry.path_for(repo_path), **kwargs)
+
+    def build(self, incremental: bool = True, batch_size: int = 1000, prefetch: int = 2):
+        """
+        Index the repository.
+
+        With `incremental=True` (default) only files whose content changed since the
+        last build are re-parsed and re-embedded; chunks of modified or deleted files
+        are removed from the vector store and BM25 using the manifest stored next to
+        the index.
+
+        Chunks are streamed through embedding and upsert `batch_size` at a time;
+        large batches let the provider's scheduler keep several requests in flight.
+        """
+        print(f"🚀 Starting index build for {self.repo_path}...")
 
-        if not exists:
-            self.client.create_collection(
-                collection_name=self.collection_name,
-                vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
+        manifest_path = os.path.join(self.output_dir, "manifest.json")
+        bm25_path = os.path.join(self.output_dir, "bm25.pkl")
+
+        manifest = self._load_manifest(manifest_path, bm25_path) if incremental else None
+        full_rebuild = manifest is None
+        if full_rebuild:
+            print("🆕 No usable manifest, performing full rebuild...")
+            self._reset_collection()
+            manifest = IndexManifest(
+                repo_path=os.path.abspath(self.repo_path),
+                vector_size=self.vector_size,
+                vector_backend=self.vector_backend,
+                embedding_model=self.embedding_service.model,
             )
-        else:
-            # Check if vector size matches, if not, recreate
-            collection_info = self.client.get_collection(self.collection_name)
-            if collection_info.config.params.vectors.size != vector_size:
-                print(
-                    f"⚠️ Vector size mismatch ({collection_info.config.params.vectors.size} != {vector_size})."
-                )
-                # Close client before physical delete
-                self.client.close()
-                import shutil
-
-                print(f"🧹 Physically removing {qdrant_path} for clean rebuild...")
-                shutil.rmtree(qdrant_path, ignore_errors=True)
-
-                # Re-init client
-                self.client = QdrantClient(path=qdrant_path)
-                print(f"🆕 Creating new collection with size {vector_size}...")
-                self.client.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=VectorParams(
-                        size=vector_size, distance=Distance.COSINE
-                    ),
-                )
 
-    def _to_uuid(self, id_str: str) -> str:
-        """Deterministically converts a string ID to a UUID."""
-        hash_hex = hashlib.md5(id_str.encode("utf-8")).hexdigest()
-        return str(uuid.UUID(hash_hex))
+        # Checked before crawling: edits made during the build count as dirty too
+        commit = repo_commit(self.repo_path) or ""
+        manifest.dirty = repo_is_dirty(self.repo_path)
 
-    def build(self):
-        print(f"🚀 Starting index build for {self.repo_path}...")
+        # 1. Crawl and diff against the manifest
+        print("📂 Crawling files...")
+        file_paths = list(self.crawler.scan())
+        diff = manifest.diff(self.repo_path, file_paths)
+        print(
+            f"🔎 {len(diff.added)} added, {len(diff.modified)} modified, "
+            f"{len(diff.removed)} removed, {len(diff.unchanged)} unchanged."
+        )
 
-        all_chunks: List[CodeChunk] = []
+        self._apply(manifest, diff, commit, full_rebuild, batch_size, prefetch)
 
-        # 1. Crawl and Parse
-        print("📂 Crawling and parsing files...")
-        file_paths = list(self.crawler.scan())
+    def update(
+        self,
+        old_commit: str = None,
+        new_commit: str = None,
+        batch_size: int = 1000,
+        prefetch: int = 2,
+    ):
+        """
+        Follow the repository from `old_commit` to `new_commit` using `git diff`,
+        touching only the chunks of added/modified/deleted/renamed files.
+
+        `old_commit` defaults to the commit recorded in the manifest and `new_commit`
+        to HEAD, which must be checked out (files are read from the work tree).
+        Falls back to `build()` when there is no usable manifest or git history, and
+        when the index or the work tree holds uncommitted changes.
+        """
+        manifest_path = os.path.join(self.output_dir, "manifest.json")
+        bm25_path = os.path.join(self.output_dir, "bm25.pkl")
 
-        for path in tqdm(file_paths, desc="Parsing"):
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    code = f.read()
-
-                # Get relative path for cleaner metadata
-                rel_path = os.path.relpath(path, self.repo_path)
-                chunks = self.parser.extract_structures(code, rel_path)
-                all_chunks.extend(chunks)
-            except Exception as e:
-                print(f"⚠️ Error processing {path}: {e}")
-
-        print(f"✅ Found {len(all_chunks)} chunks.")
-
-        if not all_chunks:
-            return
-
-        # 2. Embed & Index Vector
-        print("🧠 Generating embeddings & Vector Indexing...")
-        batch_size = 100
-        points = []
-
-        for i in tqdm(range(0, len(all_chunks), batch_size), desc="Embedding"):
-            batch = all_chunks[i : i + batch_size]
-            texts = [c.content for c in batch]
-            vectors = self.embedding_service.get_embeddings(texts)
-
-            for chunk, vector in zip(batch, vectors):
-                points.append(
-                    PointStruct(
-                        id=self._to_uuid(chunk.id),  # Convert to UUID
-                        vector=vector,
-                        # CRITICAL: Use mode='json' to ensure payload is primitive types (no Enums)
-                        payload=chunk.model_dump(mode="json", exclude={"id"}),
-                    )
-                )
+        head = repo_commit(self.repo_path)
+        manifest = self._load_manifest(manifest_path, bm25_path)
+        old_commit = old_commit or (manifest.commit if manifest else None)
+        if manifest is None or not old_commit or not head:
+            print("ℹ️ No indexed commit to diff against, running a regular build.")
+            return self.build(batch_size=batch_size, prefetch=prefetch)
+        if manifest.dirty or repo_is_dirty(self.repo_path):
+            # git diff only sees commits: uncommitted edits, indexed earlier or
+            # pending now (and their reverts), are found by the file hashes instead
+            print("ℹ️ Uncommitted changes involved, comparing files with the manifest.")
+            return self.build(batch_size=batch_size, prefetch=prefetch)
+
+        new_commit = _resolve_commit(self.repo_path, new_commit or head)
+        if new_commit != head:
+            raise ValueError(
+                f"Commit {new_commit[:8]} is not checked out (HEAD is {head[:8]})."
+            )
 
-        self.client.upsert(collection_name=self.collection_name, points=points)
-        print(f"💾 Vector index saved to {os.path.join(self.output_dir, 'qdrant')}")
+        print(f"🚀 Updating index {old_commit[:8]} -> {new_commit[:8]}...")
+        diff = diff_commits(
+            self.repo_path, old_commit, new_commit, manifest, self.crawler.accepts
+        )
+        if diff is None:
+            return self.build(batch_size=batch_size, prefetch=prefetch)
+        print(
+            f"🔎 {len(diff.added)} added, {len(diff.modified)} modified, "
+            f"{len(diff.removed)} removed."
+        )
 
-        # 3. Build & Save BM25
-        print("📚 Building BM25 index...")
-        bm25_retriever = BM25Retriever()
-        bm25_retriever.index(all_chunks)
+        self._apply(manifest, diff, new_commit, False, batch_size, prefetch)
 
-        # Save as JSON (the retriever handles the extension replacement, but let's be explicit)
+    def _apply(
+        self,
+        manifest: IndexManifest,
+        diff: ManifestDiff,
+        commit: str,
+        full_rebuild: bool,
+        batch_size: int,
+        prefetch: int,
+    ):
+        """Applies a file-level diff to the vector store, BM25 and the manifest."""
+        try:
+            self._apply_diff(
+                manifest, diff, commit, full_rebuild, batch_size, prefetch
+            )
+        finally:
+            self.store.close()
+
+    def _apply_diff(
+        self,
+        manifest: IndexManifest,
+        diff: ManifestDiff,
+        commit: str,
+        full_rebuild: bool,
+        batch_size: int,
+        prefetch: int,
+    ):
+        manifest_path = os.path.join(self.output_dir, "manifest.json")
         bm25_path = os.path.join(self.output_dir, "bm25.pkl")
+        self._report(
+            stage="indexing",
+            files_total=len(diff.changed),
+            files_parsed=0,
+            chunks_embedded=0,
+        )
+
+        # 2. Drop chunks of modified/removed files
+        stale_ids = [
+            cid for rel_path in diff.stale for cid in manifest.files[rel_path].chunk_ids
+        ]
+        if stale_ids:
+            self.store.delete(stale_ids)
+            print(f"🗑️ Removed {len(stale_ids)} stale vectors.")
+        for rel_path in diff.stale:
+            del manifest.files[rel_path]
+
+        # 3. Patch BM25: drop chunks of stale files (statistics are adjusted, not rebuilt)
+        bm25_retriever = BM25Retriever()
+        if not full_rebuild:
+            bm25_retriever.load(bm25_path)
+        bm25_retriever.remove_files(diff.stale)
+
+        symbols_path = os.path.join(self.output_dir, SYMBOLS_FILE)
+        symbols = SymbolIndex() if full_rebuild else SymbolIndex.load(symbols_path)
+        symbols.remove_files(diff.stale)
+
+        # 4. Stream parse -> embed -> upsert -> BM25 in bounded batches.
+        # Parsing runs ahead in a background thread but is capped at `prefetch`
+        # batches, so memory is proportional to the batch size, not the repo size.
+        print("🧠 Parsing, embedding & indexing changed files...")
+        total_chunks = 0
+        chunk_stream = self._iter_chunks(diff.changed, manifest)
+        for batch in _prefetch(_batched(chunk_stream, batch_size), depth=prefetch):
+            self._check_cancelled()
+            self._index_batch(batch)
+            bm25_retriever.add(batch)
+            symbols.add(batch)
+            total_chunks += len(batch)
+            self._report(chunks_embedded=total_chunks)
+
+        print(f"✅ Indexed {total_chunks} new chunks.")
+
+        self._check_cancelled()
+        self._report(stage="saving")
+        self.store.save()
+        print(f"💾 Vector index ({self.vector_backend}) saved to {self.output_dir}")
+
+        # 5. Save BM25
+        # Binary columnar format (the retriever derives the file name from bm25_path)
         bm25_retriever.save(bm25_path)
-        print(f"💾 BM25 index saved to {bm25_path.replace('.pkl', '.json')}")
+        print(f"💾 BM25 index saved to {index_file_path(bm25_path)}")
+        symbols.save(symbols_path)
+        print(f"💾 Symbol index saved to {symbols_path} ({len(symbols)} chunks)")
+
+        # 6. Persist the manifest last, so an interrupted build is redone next time
+        manifest.commit = commit
+        manifest.save(manifest_path)
 
         print("🎉 Indexing complete!")
+        self._report(stage="done")
 
         # Verify count
-        count = self.client.count(collection_name=self.collection_name)
-        print(f"📈 Total vectors in collection: {count.count}")
+        print(f"📈 Total vectors in collection: {self.store.count()}")
+        if hasattr(self.embedding_service, "stats"):
+            stats = self.embedding_service.stats()
+            print(
+                f"🗃️ Embedding cache: {stats['memory_hits'] + stats['disk_hits']} hits, "
+                f"{stats['misses']} misses ({stats['hit_rate']:.0%})"
+            )
 
-        # Explicitly close the client to release file locks
-        self.client.close()
+    def _iter_chunks(
+        self, rel_paths: List[str], manifest: IndexManifest
+    ) -> Generator[CodeChunk, None, None]:
+        """Parses files lazily, recording each one in the manifest as it goes."""
+        parsed_files = self.parser.iter_files(rel_paths)
+        progress = tqdm(parsed_files, total=len(rel_paths), desc="Parsing")
+        try:
+            for files_parsed, parsed in enumerate(progress, start=1):
+                self._check_cancelled()
+                self._report(files_parsed=files_parsed)
+                if parsed.error:
+                    print(f"⚠️ Error processing {parsed.error}")
+                    continue
+
+                manifest.files[parsed.rel_path] = FileRecord(
+                    size=parsed.size,
+                    mtime=parsed.mtime,
+                    hash=parsed.hash,
+                    chunk_ids=[c.id for c in parsed.chunks],
+                )
+                yield from parsed.chunks
+        finally:
+            progress.close()
+            parsed_files.close()
+
+    def _index_batch(self, batch: List[CodeChunk]):
+        """Embeds one batch and upserts it; the vectors are dropped afterwards."""
+        # One float32 matrix per batch instead of lists of Python floats
+        vectors = np.asarray(
+            self.embedding_service.get_embeddings([c.content for c in batch]),
+            dtype=np.float32,
+        )
+        # The chunk itself lives in the BM25 chunk table; the payload only
+        # carries its id and location (mode='json': primitive types, no Enums)
+        payloads = [
+            {
+                "chunk_id": chunk.id,
+                **chunk.model_dump(mode="json", exclude={"id", "content", "metadata"}),
+            }
+            for chunk in batch
+        ]
+        self.store.upsert([c.id for c in batch], vectors, payloads)
+
+    def _report(self, **fields):
+        self.progress.update(fields)
+        if self.progress_callback:
+            self.progress_callback(dict(self.progress))
+
+    def _check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise IndexingCancelled("Index build was cancelled.")
+
+    def _load_manifest(
+        self, manifest_path: str, bm25_path: str
+    ) -> Optional[IndexManifest]:
+        """Returns the existing manifest if it still describes this index."""
+        if self.store.recreated:
+            return None
+        manifest = IndexManifest.load(manifest_path)
+        if manifest is None:
+            return None
+        if manifest.repo_path != os.path.abspath(self.repo_path):
+            print(f"🔀 Index belongs to {manifest.repo_path}, not reusing it.")
+            return None
+        if manifest.vector_size != self.vector_size:
+            return None
+        if manifest.vector_backend != self.vector_backend:
+            print(f"🔀 Index was built for the {manifest.vector_backend} backend.")
+            return None
+        model = self.embedding_service.model
+        if manifest.embedding_model and manifest.embedding_model != model:
+            print(f"🔀 Index was embedded with {manifest.embedding_model}, not {model}.")
+            return None
+        if not os.path.exists(index_file_path(bm25_path)):
+            return None
+        if not os.path.exists(os.path.join(self.output_dir, SYMBOLS_FILE)):
+            return None
+        manifest.embedding_model = model  # older manifests did not record it
+        return manifest
+
+    def _reset_collection(self):
+        """Drops and recreates the collection so no stale points survive a full rebuild."""
+        self.store.reset()
+        # Readers pick the backend from the files present, so drop the other one's
+        if self.vector_backend == "numpy":
+            shutil.rmtree(os.path.join(self.output_dir, "qdrant"), ignore_errors=True)
+        else:
+            for name in (VECTORS_FILE, HNSW_FILE):
+                path = os.path.join(self.output_dir, name)
+                if os.path.exists(path):
+                    os.remove(path)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,211 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional
+import numpy as np
+
+from .embeddings import EmbeddingService
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys (line endings and outer whitespace only)."""
+    return text.replace("\r\n", "\n").strip()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed vector store: an in-memory LRU in front of a SQLite file.
+    The disk part is bounded by `max_disk_bytes`; least recently used rows are evicted.
+    Vectors are held as float32 arrays (6 KiB at 1536 dims, not ~50 KiB of floats).
+    """
+
+    def __init__(
+        self,
+        path: str = "data/embedding_cache.db",
+        max_memory_items: int = 10000,
+        max_disk_bytes: int = 2 * 1024**3,
+    ):
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, "
+            "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings (last_access)"
+        )
+        self._conn.commit()
+        self._disk_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    @staticmethod
+    def make_key(namespace: str, text: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{namespace}:{digest}"
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self.memory_hits += 1
+                else:
+                    missing.append(key)
+
+            if missing:
+                # SQLite limits the number of bound parameters per statement
+                for i in range(0, len(missing), 500):
+                    batch = missing[i : i + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                        batch,
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[key] = vector
+                        self._remember(key, vector)
+                    if rows:
+                        now = time.time()
+                        self._conn.executemany(
+                            "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                            [(now, key) for key, _ in rows],
+                        )
+                self._conn.commit()
+
+                disk_hits = sum(1 for key in missing if key in found)
+                self.disk_hits += disk_hits
+                self.misses += len(missing) - disk_hits
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        with self._lock:
+            now = time.time()
+            rows = []
+            for key, vector in items.items():
+                vector = np.asarray(vector, dtype=np.float32)
+                blob = vector.tobytes()
+                rows.append((key, blob, len(blob), now))
+                self._remember(key, vector)
+
+            old_sizes = self._sizes([key for key, *_ in rows])
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, size, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._disk_bytes += sum(r[2] for r in rows) - sum(old_sizes.values())
+            self._evict()
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups
+            if lookups
+            else 0.0,
+            "disk_bytes": self._disk_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _sizes(self, keys: List[str]) -> Dict[str, int]:
+        sizes = {}
+        for i in range(0, len(keys), 500):
+            batch = keys[i : i + 500]
+            placeholders = ",".join("?" * len(batch))
+            sizes.update(
+                self._conn.execute(
+                    f"SELECT key, size FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+            )
+        return sizes
+
+    def _evict(self):
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        # Drop the least recently used rows until we are 10% under the budget
+        target = int(self.max_disk_bytes * 0.9)
+        cursor = self._conn.execute(
+            "SELECT key, size FROM embeddings ORDER BY last_access ASC"
+        )
+        doomed = []
+        for key, size in cursor:
+            if self._disk_bytes <= target:
+                break
+            doomed.append((key,))
+            self._disk_bytes -= size
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", doomed)
+
+
+class CachedEmbeddingService(EmbeddingService):
+    """
+    Wraps any EmbeddingService so identical texts are only embedded once.
+    Keys include provider and model, so switching either never returns stale vectors.
+    """
+
+    def __init__(self, service: EmbeddingService, cache: Optional[EmbeddingCache] = None):
+        self.service = service
+        self.cache = cache or EmbeddingCache(
+            path=os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.db")
+        )
+        self.provider = getattr(service, "provider", type(service).__name__)
+        self.model = getattr(service, "model", "")
+        self.namespace = f"{self.provider}/{self.model}"
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        keys = [EmbeddingCache.make_key(self.namespace, t) for t in texts]
+        found = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once, even if it repeats within the batch
+        pending: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in pending:
+                pending[key] = text
+
+        if pending:
+            vectors = self.service.get_embeddings(list(pending.values()))
+            fresh = dict(zip(pending.keys(), vectors))
+            self.cache.put_many(fresh)
+            found.update(fresh)
+
+        return [np.asarray(found[key]).tolist() for key in keys]
+
+    def stats(self) -> Dict[str, float]:
+        return self.cache.stats()
@@ -74,6 +74,19 @@ class RepositoryCrawler:
                 if file_path.suffix in self.extensions:
                     yield file_path
 
+    def accepts(self, rel_path: str) -> bool:
+        """
+        True if `scan()` would yield this path (relative to the root).
+        Used to filter git diffs without walking the tree.
+        """
+        path = Path(rel_path)
+        if any(
+            part in self.ignore_dirs or part.startswith(".")
+            for part in path.parts[:-1]
+        ):
+            return False
+        return path.suffix in self.extensions
+
 
 if __name__ == "__main__":
     # Test crawler
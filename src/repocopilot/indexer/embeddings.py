@@ -1,32 +1,54 @@
-from typing import List
+from typing import Dict, List, Tuple
 import os
-import time
+import math
+import zlib
+import hashlib
+from collections import Counter
 import numpy as np
 from openai import OpenAI
 
+from .scheduler import EmbeddingScheduler, is_rate_limit_error
+from ..retriever.tokenizer import CODE_STOPWORDS, CodeTokenizer
+
 
 class EmbeddingService:
+    provider: str = "base"
+    model: str = ""
+
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         raise NotImplementedError
 
 
 class OpenAIEmbeddingService(EmbeddingService):
+    provider = "openai"
+
     def __init__(self, model: str = None):
         self.client = OpenAI(
             api_key=os.getenv("OPENAI_API_KEY"),
             base_url=os.getenv("EMBEDDING_API_BASE") or os.getenv("OPENAI_API_BASE"),
         )
         self.model = model or os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+        # 0 means "no client-side limit"; 429s are still retried with backoff
+        self.scheduler = EmbeddingScheduler(
+            self._embed_batch,
+            batch_size=100,
+            max_concurrency=int(os.getenv("EMBEDDING_CONCURRENCY", 4)),
+            tokens_per_minute=int(os.getenv("EMBEDDING_TPM_LIMIT", 0)),
+            requests_per_minute=int(os.getenv("EMBEDDING_RPM_LIMIT", 0)),
+        )
 
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
-        if not texts:
-            return []
+        return self.scheduler.run(texts)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
         texts = [t.replace("\n", " ") for t in texts]
         response = self.client.embeddings.create(input=texts, model=self.model)
         return [data.embedding for data in response.data]
 
 
 class GeminiEmbeddingService(EmbeddingService):
+    provider = "gemini"
+
     def __init__(self, model: str = None):
         from google import genai
 
@@ -39,73 +61,144 @@ class GeminiEmbeddingService(EmbeddingService):
         self.model = model or os.getenv("EMBEDDING_MODEL", "text-embedding-004")
         # Default to 1M TPM if not set
         self.tpm_limit = int(os.getenv("GEMINI_TPM_LIMIT", 1000000))
+        # Gemini allows max 100 texts per request
+        self.scheduler = EmbeddingScheduler(
+            self._embed_batch,
+            batch_size=100,
+            max_concurrency=int(os.getenv("EMBEDDING_CONCURRENCY", 4)),
+            tokens_per_minute=self.tpm_limit,
+            requests_per_minute=int(os.getenv("GEMINI_RPM_LIMIT", 0)),
+        )
 
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
-        if not texts:
-            return []
+        try:
+            return self.scheduler.run(texts)
+        except Exception as e:
+            if is_rate_limit_error(e):
+                print(f"⚠️ Gemini Rate Limit Hit (TPM={self.tpm_limit}). Error: {e}")
+            else:
+                print(f"Gemini Embedding Error: {e}")
+            raise e
 
-        # Internal batching for the API (Gemini allows max 100 per request)
-        batch_size = 100
-        all_embeddings = []
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        result = self.client.models.embed_content(model=self.model, contents=texts)
+        return [e.values for e in result.embeddings]
 
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i : i + batch_size]
 
-            # Estimate tokens to stay under TPM limit (Approx: 1 token ~ 4 chars)
-            batch_tokens = sum(len(t) for t in batch) // 4
-
-            # Wait time (seconds) to respect the TPM limit
-            # (batch_tokens / tpm_limit) * 60 seconds
-            wait_time = (
-                (batch_tokens / self.tpm_limit) * 60 if self.tpm_limit > 0 else 0
-            )
-
-            try:
-                # Synchronous call
-                result = self.client.models.embed_content(
-                    model=self.model, contents=batch
-                )
+class MockEmbeddingService(EmbeddingService):
+    provider = "mock"
 
-                # Extract results
-                all_embeddings.extend([e.values for e in result.embeddings])
+    def __init__(self, dim: int = 1536):
+        self.dim = dim
+        self.model = f"random-{dim}"
 
-                # Simple pacing between batches to stay under TPM
-                if i + batch_size < len(texts) or wait_time > 0.1:
-                    time.sleep(wait_time)
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # Seeded by the text: the same text always gets the same vector, so mock
+        # indexes and benchmark runs are reproducible
+        embeddings = np.empty((len(texts), self.dim))
+        for i, text in enumerate(texts):
+            digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+            rng = np.random.default_rng(int.from_bytes(digest, "little"))
+            embeddings[i] = rng.random(self.dim)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return (embeddings / norms).tolist()
 
-            except Exception as e:
-                if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e):
-                    print(f"⚠️ Gemini Rate Limit Hit (TPM={self.tpm_limit}). Error: {e}")
-                else:
-                    print(f"Gemini Embedding Error: {e}")
-                raise e
 
-        return all_embeddings
+class HashingEmbeddingService(EmbeddingService):
+    """
+    Offline, deterministic embeddings via the hashing trick: every code token
+    (identifiers plus their camelCase/snake_case parts, see `CodeTokenizer`) and its
+    character trigrams are hashed into `dim` signed buckets, weighted by 1 + log(tf)
+    and L2-normalized. Texts that share identifiers or word stems get similar
+    vectors, so vector search is meaningful without a model or network.
+    """
 
+    provider = "hashing"
+    TRIGRAM_WEIGHT = 1.0  # L2 mass of a token's trigrams relative to the token
 
-class MockEmbeddingService(EmbeddingService):
-    def __init__(self, dim: int = 1536):
-        self.dim = dim
+    def __init__(self, dim: int = None, cache_size: int = 200_000):
+        self.dim = dim or int(os.getenv("HASHING_EMBEDDING_DIM", 768))
+        self.model = f"hashing-v1-{self.dim}"
+        self.tokenizer = CodeTokenizer(stopwords=CODE_STOPWORDS)
+        self.cache_size = cache_size
+        # token -> (buckets, signed weights), shared by all texts
+        self._features: Dict[str, Tuple[List[int], List[float]]] = {}
 
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         if not texts:
             return []
-        rng = np.random.default_rng()
-        embeddings = rng.random((len(texts), self.dim))
+        buckets: List[int] = []
+        weights: List[float] = []
+        sizes: List[int] = []  # features per (text, token)
+        scales: List[float] = []  # tf weight per (text, token)
+        rows: List[int] = []  # text of each (text, token)
+        for row, text in enumerate(texts):
+            # Texts without any word still get a (shared) non-zero vector
+            counts = Counter(self.tokenizer.tokenize(text)) or Counter({"": 1})
+            for token, tf in counts.items():
+                token_buckets, token_weights = self._token_features(token)
+                buckets.extend(token_buckets)
+                weights.extend(token_weights)
+                sizes.append(len(token_buckets))
+                scales.append(1.0 + math.log(tf))
+                rows.append(row)
+
+        sizes = np.asarray(sizes)
+        values = np.asarray(weights) * np.repeat(scales, sizes)
+        flat = np.repeat(np.asarray(rows) * self.dim, sizes) + np.asarray(buckets)
+        embeddings = np.bincount(
+            flat, weights=values, minlength=len(texts) * self.dim
+        ).reshape(len(texts), self.dim)
         norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0  # every feature cancelled out by sign collisions
         return (embeddings / norms).tolist()
 
+    def _token_features(self, token: str) -> Tuple[List[int], List[float]]:
+        features = self._features.get(token)
+        if features is None:
+            marked = f"<{token}>"
+            trigrams = [marked[i : i + 3] for i in range(len(marked) - 2)]
+            names = [f"w:{token}"] + [f"g:{g}" for g in trigrams]
+            trigram_weight = self.TRIGRAM_WEIGHT / math.sqrt(len(trigrams) or 1)
+            buckets, weights = [], []
+            for i, name in enumerate(names):
+                # crc32 is stable across processes, unlike hash()
+                h = zlib.crc32(name.encode("utf-8"))
+                buckets.append(h % self.dim)
+                sign = 1.0 if h & 0x80000000 else -1.0
+                weights.append(sign * (1.0 if i == 0 else trigram_weight))
+            features = (buckets, weights)
+            if len(self._features) >= self.cache_size:
+                self._features.clear()
+            self._features[token] = features
+        return features
+
 
 def get_embedding_service(
-    use_mock: bool = False, provider: str = None
+    use_mock: bool = False, provider: str = None, use_cache: bool = None
 ) -> EmbeddingService:
     effective_provider = provider or os.getenv("EMBEDDING_PROVIDER", "mock").lower()
 
     if use_mock or effective_provider == "mock":
         # Gemini 004 is 768, OpenAI is 1536
+        # Random vectors are not worth caching
         return MockEmbeddingService(dim=768 if effective_provider == "gemini" else 1536)
 
+    if effective_provider == "hashing":
+        # Local and cheaper to recompute than to look up
+        return HashingEmbeddingService()
+
     if effective_provider == "gemini":
-        return GeminiEmbeddingService()
+        service = GeminiEmbeddingService()
+    else:
+        service = OpenAIEmbeddingService()
+
+    if use_cache is None:
+        use_cache = os.getenv("EMBEDDING_CACHE", "1").lower() not in ("0", "false", "no")
+    if use_cache:
+        from .cache import CachedEmbeddingService
 
-    return OpenAIEmbeddingService()
+        return CachedEmbeddingService(service)
+    return service
@@ -0,0 +1,75 @@
+import os
+from typing import Callable, Optional
+
+from .manifest import ManifestDiff, IndexManifest
+
+
+def diff_commits(
+    repo_path: str,
+    old_commit: str,
+    new_commit: str,
+    manifest: IndexManifest,
+    accepts: Callable[[str], bool],
+) -> Optional[ManifestDiff]:
+    """
+    Translates `git diff old..new` into a ManifestDiff for the files under `repo_path`.
+    Renames become remove + add. Paths rejected by `accepts` (crawler rules) are ignored.
+    Returns None if the diff cannot be computed (not a git repo, unknown commit).
+    """
+    try:
+        import git
+
+        repo = git.Repo(repo_path, search_parent_directories=True)
+        output = repo.git.diff(
+            "--name-status", "-M", "-z", "--no-color", old_commit, new_commit
+        )
+    except Exception as e:
+        print(f"⚠️ git diff {old_commit[:8]}..{new_commit[:8]} failed: {e}")
+        return None
+
+    root = repo.working_tree_dir
+    repo_abs = os.path.abspath(repo_path)
+
+    def to_rel(git_path: str) -> Optional[str]:
+        # git paths are relative to the work tree root, ours to repo_path
+        rel = os.path.relpath(os.path.join(root, git_path), repo_abs)
+        if rel.startswith(".."):
+            return None
+        return rel
+
+    added, removed = set(), set()
+    fields = output.split("\0")
+    i = 0
+    while i < len(fields) and fields[i]:
+        status = fields[i]
+        if status[0] in ("R", "C"):
+            old_path, new_path = fields[i + 1], fields[i + 2]
+            i += 3
+        else:
+            old_path = new_path = fields[i + 1]
+            i += 2
+
+        if status[0] == "D":
+            removed.add(old_path)
+        elif status[0] == "R":
+            removed.add(old_path)
+            added.add(new_path)
+        else:  # A, C, M, T
+            added.add(new_path)
+
+    diff = ManifestDiff()
+    for git_path in sorted(removed - added):
+        rel = to_rel(git_path)
+        if rel is not None and rel in manifest.files:
+            diff.removed.append(rel)
+    for git_path in sorted(added):
+        rel = to_rel(git_path)
+        if rel is None or not accepts(rel):
+            continue
+        if not os.path.exists(os.path.join(repo_path, rel)):
+            continue
+        if rel in manifest.files:
+            diff.modified.append(rel)
+        else:
+            diff.added.append(rel)
+    return diff
@@ -0,0 +1,118 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Iterable, Optional
+from pydantic import BaseModel, Field
+
+# 2: chunks carry parent_name and call sites, and a symbol index is stored
+# 3: BM25 uses the code-aware tokenizer
+# 4: vector payloads reference chunks by id instead of copying their content
+MANIFEST_VERSION = 4
+
+
+class FileRecord(BaseModel):
+    size: int
+    mtime: float
+    hash: str
+    chunk_ids: List[str] = Field(default_factory=list)
+
+
+class ManifestDiff(BaseModel):
+    added: List[str] = Field(default_factory=list)
+    modified: List[str] = Field(default_factory=list)
+    removed: List[str] = Field(default_factory=list)
+    unchanged: List[str] = Field(default_factory=list)
+
+    @property
+    def changed(self) -> List[str]:
+        """Files that need to be (re-)parsed and embedded."""
+        return self.added + self.modified
+
+    @property
+    def stale(self) -> List[str]:
+        """Files whose previously indexed chunks must be dropped."""
+        return self.modified + self.removed
+
+
+class IndexManifest(BaseModel):
+    """
+    Per-file record of what is currently in the index.
+    Stored next to the index so a rebuild only touches files that changed.
+    """
+
+    version: int = MANIFEST_VERSION
+    repo_path: str = ""
+    vector_size: int = 0
+    vector_backend: str = "qdrant"
+    embedding_model: str = ""  # vectors from another model cannot be mixed in
+    commit: str = ""  # HEAD of the repository when the index was built
+    dirty: bool = False  # built with uncommitted changes, so `commit` is not exact
+    files: Dict[str, FileRecord] = Field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IndexManifest"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = cls(**json.load(f))
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable manifest {path}: {e}")
+            return None
+        if manifest.version != MANIFEST_VERSION:
+            return None
+        return manifest
+
+    def save(self, path: str):
+        # Write to a temp file first so a crash never leaves a half-written manifest
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.model_dump(mode="json"), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def diff(self, repo_path: str, paths: Iterable[Path]) -> ManifestDiff:
+        """
+        Compare the files on disk against the manifest.
+        Size + mtime is the fast path; the content hash decides when they differ,
+        so a touched-but-identical file is not re-embedded.
+        """
+        result = ManifestDiff()
+        seen = set()
+
+        for path in paths:
+            rel_path = os.path.relpath(path, repo_path)
+            seen.add(rel_path)
+            record = self.files.get(rel_path)
+            if record is None:
+                result.added.append(rel_path)
+                continue
+
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            if stat.st_size == record.size and stat.st_mtime == record.mtime:
+                result.unchanged.append(rel_path)
+                continue
+
+            if file_hash(path) == record.hash:
+                # Content is the same, only refresh the stat fields
+                record.size = stat.st_size
+                record.mtime = stat.st_mtime
+                result.unchanged.append(rel_path)
+            else:
+                result.modified.append(rel_path)
+
+        result.removed = [p for p in self.files if p not in seen]
+        return result
+
+
+def file_hash(path) -> str:
+    """SHA-256 of the raw file bytes."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
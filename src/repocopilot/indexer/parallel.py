@@ -0,0 +1,157 @@
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, List, Optional, Tuple, Generator, NamedTuple
+
+from ..common.schema import CodeChunk, ChunkType
+from .parser import CodeParser
+
+# (id, content, file_path, start_line, end_line, type, name, parent_name, metadata)
+ChunkRecord = Tuple[
+    str, str, str, int, int, str, Optional[str], Optional[str], Dict[str, Any]
+]
+
+
+class ParsedFile(NamedTuple):
+    rel_path: str
+    size: int
+    mtime: float
+    hash: str
+    chunks: List[CodeChunk]
+    error: Optional[str] = None
+
+
+# One parser per worker process: tree-sitter languages cannot be pickled
+_worker_parser: Optional[CodeParser] = None
+
+
+def _init_worker():
+    global _worker_parser
+    _worker_parser = CodeParser()
+
+
+def _parse_group(repo_path: str, rel_paths: List[str]) -> List[tuple]:
+    """Worker entry point: reads, hashes and parses a group of files."""
+    global _worker_parser
+    if _worker_parser is None:
+        _worker_parser = CodeParser()
+
+    results = []
+    for rel_path in rel_paths:
+        path = os.path.join(repo_path, rel_path)
+        try:
+            stat = os.stat(path)
+            with open(path, "rb") as f:
+                raw = f.read()
+            code = raw.decode("utf-8")
+            source = raw
+            if b"\r" in raw:
+                # Same text as reading in text mode: CRLF/CR become "\n"
+                code = code.replace("\r\n", "\n").replace("\r", "\n")
+                source = None
+            chunks = _worker_parser.extract_structures(code, rel_path, source=source)
+        except Exception as e:
+            results.append((rel_path, 0, 0.0, "", [], f"{path}: {e}"))
+            continue
+
+        # Plain tuples are much cheaper to pickle than pydantic models
+        records = [
+            (
+                c.id,
+                c.content,
+                c.file_path,
+                c.start_line,
+                c.end_line,
+                c.type.value,
+                c.name,
+                c.parent_name,
+                c.metadata,
+            )
+            for c in chunks
+        ]
+        results.append(
+            (
+                rel_path,
+                stat.st_size,
+                stat.st_mtime,
+                hashlib.sha256(raw).hexdigest(),
+                records,
+                None,
+            )
+        )
+    return results
+
+
+def _to_chunk(record: ChunkRecord) -> CodeChunk:
+    chunk_id, content, file_path, start_line, end_line, type_, name, parent, meta = record
+    return CodeChunk(
+        id=chunk_id,
+        content=content,
+        file_path=file_path,
+        start_line=start_line,
+        end_line=end_line,
+        type=ChunkType(type_),
+        name=name,
+        parent_name=parent,
+        metadata=meta,
+    )
+
+
+class ParallelParser:
+    """
+    Parses files on a process pool.
+
+    Files are dispatched in groups of `chunksize` to amortize IPC, and at most
+    `2 * workers` groups are in flight so results never pile up faster than
+    the consumer (embedding) drains them. Small workloads are parsed in-process.
+    """
+
+    def __init__(self, repo_path: str, workers: int = None, chunksize: int = 16):
+        self.repo_path = repo_path
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.chunksize = max(1, chunksize)
+
+    def iter_files(self, rel_paths: List[str]) -> Generator[ParsedFile, None, None]:
+        """Yields one ParsedFile per input path, in completion order."""
+        groups = [
+            rel_paths[i : i + self.chunksize]
+            for i in range(0, len(rel_paths), self.chunksize)
+        ]
+
+        if self.workers == 1 or len(groups) < 2:
+            for group in groups:
+                yield from self._unpack(_parse_group(self.repo_path, group))
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker
+        ) as pool:
+            pending = set()
+            next_group = 0
+            max_in_flight = self.workers * 2
+
+            try:
+                while next_group < len(groups) or pending:
+                    while next_group < len(groups) and len(pending) < max_in_flight:
+                        group = groups[next_group]
+                        pending.add(pool.submit(_parse_group, self.repo_path, group))
+                        next_group += 1
+
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from self._unpack(future.result())
+            finally:
+                # Closed early: drop queued groups, the pool only waits for running ones
+                for future in pending:
+                    future.cancel()
+
+    def _unpack(self, results: List[tuple]) -> Generator[ParsedFile, None, None]:
+        for rel_path, size, mtime, digest, records, error in results:
+            yield ParsedFile(
+                rel_path=rel_path,
+                size=size,
+                mtime=mtime,
+                hash=digest,
+                chunks=[_to_chunk(r) for r in records],
+                error=error,
+            )
@@ -1,6 +1,6 @@
 import os
-from typing import List, Any
-from tree_sitter import Language, Parser
+from typing import List, Any, Dict, Optional
+from tree_sitter import Language, Parser, Query, QueryCursor
 from ..common.schema import CodeChunk, ChunkType
 
 # Import languages
@@ -38,7 +38,8 @@ class CodeParser:
             ".rs": Language(tsrust.language()),
             ".lua": Language(tslua.language()),
         }
-        self.parser = Parser()
+        self._parsers: Dict[str, Parser] = {}
+        self._call_queries: Dict[str, Optional[QueryCursor]] = {}
 
         # Define node types that represent "Functions" or "Classes" for each language
         # This is a simplified mapping
@@ -61,14 +62,51 @@ class CodeParser:
                 "enum_item",
             ],
         }
+        self._function_types = frozenset(self.structure_types["function"])
+        self._class_types = frozenset(self.structure_types["class"])
 
     def get_language_for_file(self, file_path: str):
         ext = os.path.splitext(file_path)[1].lower()
         return self.lang_map.get(ext)
 
-    def extract_structures(self, code: str, file_path: str) -> List[CodeChunk]:
-        lang = self.get_language_for_file(file_path)
-        if not lang:
+    def _get_parser(self, file_path: str) -> Optional[Parser]:
+        """Returns a cached parser for the file's language (one per extension)."""
+        ext = os.path.splitext(file_path)[1].lower()
+        parser = self._parsers.get(ext)
+        if parser is None:
+            lang = self.lang_map.get(ext)
+            if not lang:
+                return None
+            parser = Parser(lang)
+            self._parsers[ext] = parser
+        return parser
+
+    def _get_call_query(self, file_path: str) -> Optional[QueryCursor]:
+        """Cached query capturing the callee name of every call site (None if unsupported)."""
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext not in self._call_queries:
+            patterns = _CALL_PATTERNS.get(_CALL_PATTERN_EXT.get(ext, ext))
+            lang = self.lang_map.get(ext)
+            self._call_queries[ext] = (
+                QueryCursor(Query(lang, "\n".join(patterns)))
+                if patterns and lang
+                else None
+            )
+        return self._call_queries[ext]
+
+    def extract_structures(
+        self, code: str, file_path: str, source: Optional[bytes] = None
+    ) -> List[CodeChunk]:
+        """
+        Split a file into function/class chunks.
+        Pass `source` (the UTF-8 bytes of `code`) when available to skip re-encoding.
+        """
+        if "\r" in code:
+            # Chunks use "\n" line endings, as text-mode reads of CRLF files did
+            code = code.replace("\r\n", "\n").replace("\r", "\n")
+            source = None
+        parser = self._get_parser(file_path)
+        if not parser:
             # Fallback: if language not supported, treat as one big block
             return [
                 CodeChunk(
@@ -76,17 +114,24 @@ class CodeParser:
                     content=code,
                     file_path=file_path,
                     start_line=1,
-                    end_line=len(code.splitlines()),
+                    end_line=_count_lines(code),
                     type=ChunkType.BLOCK,
                 )
             ]
 
-        # New API: Instantiate parser with language
-        parser = Parser(lang)
-        tree = parser.parse(bytes(code, "utf8"))
+        if source is None:
+            source = code.encode("utf-8")
+        tree = parser.parse(source)
 
         chunks = []
-        self._recursive_extract(tree.root_node, code, file_path, chunks)
+        self._recursive_extract(
+            tree.root_node,
+            source,
+            _line_starts(source),
+            file_path,
+            chunks,
+            calls=self._get_call_query(file_path),
+        )
 
         # If no structures found, return the whole file
         if not chunks:
@@ -96,7 +141,7 @@ class CodeParser:
                     content=code,
                     file_path=file_path,
                     start_line=1,
-                    end_line=len(code.splitlines()),
+                    end_line=_count_lines(code),
                     type=ChunkType.BLOCK,
                 )
             )
@@ -104,46 +149,178 @@ class CodeParser:
         return chunks
 
     def _recursive_extract(
-        self, node: Any, code: str, file_path: str, chunks: List[CodeChunk]
+        self,
+        node: Any,
+        source: bytes,
+        line_starts: List[int],
+        file_path: str,
+        chunks: List[CodeChunk],
+        parent_name: Optional[str] = None,
+        calls: Optional[QueryCursor] = None,
     ):
         node_type = node.type
 
         chunk_type = None
-        if node_type in self.structure_types["function"]:
+        if node_type in self._function_types:
             chunk_type = ChunkType.FUNCTION
-        elif node_type in self.structure_types["class"]:
+        elif node_type in self._class_types:
             chunk_type = ChunkType.CLASS
 
         if chunk_type:
-            start_line = node.start_point[0] + 1
-            end_line = node.end_point[0] + 1
-            content = code.splitlines()[node.start_point[0] : node.end_point[0] + 1]
+            start_row = node.start_point[0]
+            end_row = node.end_point[0]
 
-            # Try to find a name for the structure
-            name = None
-            for child in node.children:
-                if child.type == "identifier":
-                    name = code[
-                        child.start_byte : child.end_point[1]
-                    ]  # Simplified name extraction
-                    break
+            # Whole lines covered by the node, sliced straight from the source bytes
+            start = line_starts[start_row]
+            if end_row + 1 < len(line_starts):
+                end = line_starts[end_row + 1] - 1  # drop the "\n"
+            else:
+                end = len(source)
+
+            name = self._node_name(node, source)
+            metadata = {}
+            if chunk_type == ChunkType.FUNCTION and calls is not None:
+                # Call sites, for the symbol index's "who calls X" lookups
+                callees = calls.captures(node).get("callee", [])
+                if callees:
+                    metadata["calls"] = sorted(
+                        {
+                            source[c.start_byte : c.end_byte].decode("utf-8", "replace")
+                            for c in callees
+                        }
+                    )
 
             chunks.append(
                 CodeChunk(
-                    id=f"{file_path}_{start_line}_{end_line}",
-                    content="\n".join(content),
+                    id=f"{file_path}_{start_row + 1}_{end_row + 1}",
+                    content=source[start:end].decode("utf-8", errors="replace"),
                     file_path=file_path,
-                    start_line=start_line,
-                    end_line=end_line,
+                    start_line=start_row + 1,
+                    end_line=end_row + 1,
                     type=chunk_type,
                     name=name,
+                    parent_name=parent_name,
+                    metadata=metadata,
                 )
             )
             # Usually we don't want to dive deeper once a function is found
             # to avoid duplicate nested chunks, but for classes we might want methods.
             if chunk_type == ChunkType.CLASS:
                 for child in node.children:
-                    self._recursive_extract(child, code, file_path, chunks)
+                    self._recursive_extract(
+                        child, source, line_starts, file_path, chunks, name, calls
+                    )
         else:
             for child in node.children:
-                self._recursive_extract(child, code, file_path, chunks)
+                self._recursive_extract(
+                    child, source, line_starts, file_path, chunks, parent_name, calls
+                )
+
+    def _node_name(self, node: Any, source: bytes) -> Optional[str]:
+        """Finds the identifier naming a function/class node."""
+        name_node = node.child_by_field_name("name")
+        if name_node is None:
+            # C/C++ functions: the name is nested inside the declarator chain
+            declarator = node.child_by_field_name("declarator")
+            while declarator is not None and declarator.type not in _NAME_TYPES:
+                inner = declarator.child_by_field_name("declarator")
+                if inner is None:
+                    inner = declarator.child_by_field_name("name")
+                declarator = inner
+            name_node = declarator
+        if name_node is None:
+            for child in node.children:
+                if child.type in _NAME_TYPES:
+                    name_node = child
+                    break
+        if name_node is None:
+            return None
+        return source[name_node.start_byte : name_node.end_byte].decode(
+            "utf-8", errors="replace"
+        )
+
+
+_NAME_TYPES = {
+    "identifier",
+    "type_identifier",
+    "field_identifier",
+    "property_identifier",
+    "qualified_identifier",
+    "destructor_name",
+    "operator_name",
+}
+
+
+# Call sites per language; every pattern captures the called name as @callee
+_CALL_PATTERNS = {
+    ".py": [
+        "(call function: (identifier) @callee)",
+        "(call function: (attribute attribute: (identifier) @callee))",
+    ],
+    ".c": [
+        "(call_expression function: (identifier) @callee)",
+        "(call_expression function: (field_expression field: (field_identifier) @callee))",
+    ],
+    ".cpp": [
+        "(call_expression function: (identifier) @callee)",
+        "(call_expression function: (field_expression field: (field_identifier) @callee))",
+        "(call_expression function: (qualified_identifier name: (identifier) @callee))",
+    ],
+    ".cs": [
+        "(invocation_expression function: (identifier) @callee)",
+        "(invocation_expression function: (member_access_expression name: (identifier) @callee))",
+        "(object_creation_expression type: (identifier) @callee)",
+    ],
+    ".go": [
+        "(call_expression function: (identifier) @callee)",
+        "(call_expression function: (selector_expression field: (field_identifier) @callee))",
+    ],
+    ".java": [
+        "(method_invocation name: (identifier) @callee)",
+        "(object_creation_expression type: (type_identifier) @callee)",
+    ],
+    ".js": [
+        "(call_expression function: (identifier) @callee)",
+        "(call_expression function: (member_expression property: (property_identifier) @callee))",
+        "(new_expression constructor: (identifier) @callee)",
+    ],
+    ".rs": [
+        "(call_expression function: (identifier) @callee)",
+        "(call_expression function: (field_expression field: (field_identifier) @callee))",
+        "(call_expression function: (scoped_identifier name: (identifier) @callee))",
+    ],
+    ".lua": [
+        "(function_call name: (identifier) @callee)",
+        "(function_call name: (dot_index_expression field: (identifier) @callee))",
+        "(function_call name: (method_index_expression method: (identifier) @callee))",
+    ],
+}
+# Extensions sharing a grammar family with one of the keys above
+_CALL_PATTERN_EXT = {
+    ".h": ".c",
+    ".hh": ".cpp",
+    ".cc": ".cpp",
+    ".cxx": ".cpp",
+    ".hpp": ".cpp",
+    ".hxx": ".cpp",
+    ".ts": ".js",
+    ".tsx": ".js",
+}
+
+
+def _line_starts(source: bytes) -> List[int]:
+    """Byte offset of the start of every line (tree-sitter rows split on "\n")."""
+    starts = [0]
+    find = source.find
+    i = find(b"\n")
+    while i != -1:
+        starts.append(i + 1)
+        i = find(b"\n", i + 1)
+    return starts
+
+
+def _count_lines(code: str) -> int:
+    # Same result as len(code.splitlines()) for "\n" files, without building the list
+    if not code:
+        return 0
+    return code.count("\n") + (0 if code.endswith("\n") else 1)
@@ -0,0 +1,230 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import threading
+from typing import List, Dict, Any, Optional
+
+from .manifest import IndexManifest
+
+
+def repo_commit(repo_path: str) -> Optional[str]:
+    """HEAD commit SHA of `repo_path`, or None if it is not a git checkout."""
+    try:
+        import git
+
+        return git.Repo(repo_path, search_parent_directories=True).head.commit.hexsha
+    except Exception:
+        return None
+
+
+def repo_is_dirty(repo_path: str) -> bool:
+    """True if the work tree differs from HEAD (untracked files included)."""
+    try:
+        import git
+
+        repo = git.Repo(repo_path, search_parent_directories=True)
+        return repo.is_dirty(untracked_files=True)
+    except Exception:
+        return True
+
+
+class IndexRegistry:
+    """
+    Keeps one index directory per repository under `root`, side by side:
+
+        data/indexes/<repo-name>-<hash of abs path>/
+            CURRENT          name of the version being served, e.g. "v3"
+            index.json       repo path + last use
+            v3/              qdrant/ (or vectors.vec)  bm25.bm25  manifest.json
+
+    The manifest records the commit the index was built from, so a clean checkout
+    at that commit can be reopened without crawling. Background builds write into
+    a staged copy (`stage`) and switch CURRENT atomically (`publish`), so readers
+    of the old version are never disturbed. Least recently used repositories are
+    deleted once the total size exceeds `max_bytes`, except those with a version
+    that is currently served by this process (see `acquire`).
+    """
+
+    def __init__(self, root: str = "data/indexes", max_bytes: int = None):
+        self.root = root
+        if max_bytes is None:
+            max_bytes = int(os.getenv("INDEX_DISK_BUDGET_MB", 10240)) * 1024**2
+        self.max_bytes = max_bytes
+        self._in_use: Dict[str, int] = {}  # abs version dir -> number of readers
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def key_for(self, repo_path: str) -> str:
+        abs_path = os.path.abspath(repo_path)
+        name = re.sub(r"[^A-Za-z0-9_.-]+", "_", os.path.basename(abs_path)) or "repo"
+        digest = hashlib.sha1(abs_path.encode("utf-8")).hexdigest()[:10]
+        return f"{name}-{digest}"
+
+    def repo_dir(self, repo_path: str) -> str:
+        return os.path.join(self.root, self.key_for(repo_path))
+
+    def path_for(self, repo_path: str) -> str:
+        """Directory of the version currently served for `repo_path` (created if missing)."""
+        repo_dir = self.repo_dir(repo_path)
+        version = self._current_version(repo_dir)
+        if version is None:
+            version = "v1"
+            os.makedirs(os.path.join(repo_dir, version), exist_ok=True)
+            self._write_current(repo_dir, version)
+        return os.path.join(repo_dir, version)
+
+    def stage(self, repo_path: str) -> str:
+        """
+        Creates the next version directory as a copy of the current one, so an
+        incremental build can run there while the current version is being served.
+        """
+        current = self.path_for(repo_path)
+        repo_dir = self.repo_dir(repo_path)
+        numbers = [
+            int(name[1:])
+            for name in os.listdir(repo_dir)
+            if name.startswith("v") and name[1:].isdigit()
+        ]
+        staged = os.path.join(repo_dir, f"v{max(numbers, default=0) + 1}")
+        # Qdrant's lock file belongs to whoever has the current version open
+        shutil.copytree(current, staged, ignore=shutil.ignore_patterns(".lock"))
+        return staged
+
+    def publish(self, repo_path: str, version_path: str):
+        """Atomically makes `version_path` the served version."""
+        self._write_current(self.repo_dir(repo_path), os.path.basename(version_path))
+
+    def prune(self, repo_path: str, keep: List[str] = ()):
+        """Deletes old versions except the current one, served ones and those in `keep`."""
+        repo_dir = self.repo_dir(repo_path)
+        protected = {os.path.basename(os.path.normpath(p)) for p in keep}
+        protected.add(self._current_version(repo_dir))
+        for name in os.listdir(repo_dir):
+            path = os.path.join(repo_dir, name)
+            if os.path.isdir(path) and name not in protected and not self.in_use(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def acquire(self, index_dir: str):
+        """Marks a version directory as served until the matching `release`."""
+        path = os.path.abspath(index_dir)
+        with self._lock:
+            self._in_use[path] = self._in_use.get(path, 0) + 1
+
+    def release(self, index_dir: str) -> int:
+        """Drops one reference taken by `acquire`; returns how many are left."""
+        path = os.path.abspath(index_dir)
+        with self._lock:
+            count = self._in_use.get(path, 0) - 1
+            if count > 0:
+                self._in_use[path] = count
+            else:
+                self._in_use.pop(path, None)
+            return max(count, 0)
+
+    def in_use(self, path: str) -> bool:
+        """True if `path` is, or contains, a version directory that is being served."""
+        prefix = os.path.join(os.path.abspath(path), "")
+        with self._lock:
+            return any(
+                os.path.join(served, "").startswith(prefix) for served in self._in_use
+            )
+
+    def is_fresh(self, repo_path: str) -> bool:
+        """True if the index was built from, and the repository is at, a clean HEAD."""
+        index_dir = self.path_for(repo_path)
+        if not os.path.exists(os.path.join(index_dir, "bm25.bm25")):
+            return False
+        manifest = IndexManifest.load(os.path.join(index_dir, "manifest.json"))
+        if manifest is None or not manifest.commit or manifest.dirty:
+            return False
+        if manifest.commit != repo_commit(repo_path):
+            return False
+        return not repo_is_dirty(repo_path)
+
+    def touch(self, repo_path: str):
+        """Marks the repository's index as just used."""
+        os.makedirs(self.repo_dir(repo_path), exist_ok=True)
+        info_path = os.path.join(self.repo_dir(repo_path), "index.json")
+        info = self._read_info(info_path)
+        info.update(repo_path=os.path.abspath(repo_path), last_used=time.time())
+        with open(info_path, "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False)
+
+    def list(self) -> List[Dict[str, Any]]:
+        entries = []
+        for key in os.listdir(self.root):
+            index_dir = os.path.join(self.root, key)
+            if not os.path.isdir(index_dir):
+                continue
+            info = self._read_info(os.path.join(index_dir, "index.json"))
+            entries.append(
+                {
+                    "key": key,
+                    "path": index_dir,
+                    "repo_path": info.get("repo_path"),
+                    "last_used": info.get("last_used", 0.0),
+                    "bytes": _dir_size(index_dir),
+                }
+            )
+        return entries
+
+    def enforce_budget(self, keep: List[str] = ()) -> List[str]:
+        """
+        Deletes least recently used indexes until the total fits in `max_bytes`.
+        Indexes of the repositories in `keep`, and those with a served version,
+        are never removed.
+        """
+        protected = {self.key_for(p) for p in keep}
+        entries = sorted(self.list(), key=lambda e: e["last_used"])
+        total = sum(e["bytes"] for e in entries)
+
+        removed = []
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry["key"] in protected or self.in_use(entry["path"]):
+                continue
+            print(f"🧹 Evicting index {entry['key']} ({entry['bytes'] / 1024**2:.0f} MiB)")
+            shutil.rmtree(entry["path"], ignore_errors=True)
+            total -= entry["bytes"]
+            removed.append(entry["key"])
+        return removed
+
+    def _current_version(self, repo_dir: str) -> Optional[str]:
+        try:
+            with open(os.path.join(repo_dir, "CURRENT"), "r", encoding="utf-8") as f:
+                version = f.read().strip()
+        except OSError:
+            return None
+        if not os.path.isdir(os.path.join(repo_dir, version)):
+            return None
+        return version
+
+    def _write_current(self, repo_dir: str, version: str):
+        tmp_path = os.path.join(repo_dir, "CURRENT.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(repo_dir, "CURRENT"))
+
+    def _read_info(self, info_path: str) -> Dict[str, Any]:
+        if not os.path.exists(info_path):
+            return {}
+        try:
+            with open(info_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
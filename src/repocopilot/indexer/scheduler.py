@@ -0,0 +1,139 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from ..common.tokens import estimate_tokens
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    if getattr(e, "status_code", None) == 429 or getattr(e, "code", None) == 429:
+        return True
+    message = str(e)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `per_minute / 60` per second.
+    A limit of 0 (or less) disables it.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0):
+        if self.rate <= 0:
+            return
+        # A single request larger than the bucket can never fit, let it drain the bucket
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits applied together."""
+
+    def __init__(self, tokens_per_minute: float = 0, requests_per_minute: float = 0):
+        self.tpm = TokenBucket(tokens_per_minute)
+        self.rpm = TokenBucket(requests_per_minute)
+
+    def acquire(self, tokens: int):
+        self.rpm.acquire(1)
+        self.tpm.acquire(tokens)
+
+
+class EmbeddingScheduler:
+    """
+    Splits texts into provider-sized batches and embeds them on a thread pool.
+
+    - at most `max_concurrency` requests are in flight at once
+    - every request first takes its share from the RPM/TPM token buckets
+    - 429 / RESOURCE_EXHAUSTED errors are retried with exponential backoff + jitter
+    - results are returned in the order of the input texts
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], List[List[float]]],
+        batch_size: int = 100,
+        max_concurrency: int = 4,
+        tokens_per_minute: float = 0,
+        requests_per_minute: float = 0,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.embed_batch = embed_batch
+        self.batch_size = batch_size
+        self.max_concurrency = max(1, max_concurrency)
+        self.limiter = RateLimiter(tokens_per_minute, requests_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def run(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        batches = [
+            texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)
+        ]
+        if len(batches) == 1 or self.max_concurrency == 1:
+            results = [self._call(batch) for batch in batches]
+        else:
+            # Executor.map keeps input order regardless of completion order
+            results = list(self._get_pool().map(self._call, batches))
+
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    def close(self):
+        if self._pool:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency, thread_name_prefix="embed"
+                )
+            return self._pool
+
+    def _call(self, batch: List[str]) -> List[List[float]]:
+        tokens = estimate_tokens(batch)
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(tokens)
+            try:
+                vectors = self.embed_batch(batch)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                delay = min(self.max_delay, self.base_delay * 2**attempt)
+                delay *= 0.5 + random.random()
+                print(f"⚠️ Rate limit hit, retrying in {delay:.1f}s ({e})")
+                time.sleep(delay)
+                continue
+
+            if len(vectors) != len(batch):
+                raise ValueError(
+                    f"Embedding provider returned {len(vectors)} vectors for {len(batch)} texts"
+                )
+            return vectors
@@ -0,0 +1,186 @@
+import os
+import time
+import uuid
+import queue
+import shutil
+import threading
+from typing import Any, Dict, List, Optional
+
+from .build import IndexBuilder, IndexingCancelled
+from .registry import IndexRegistry, repo_is_dirty
+
+
+class IndexJob:
+    """One queued/running index build and its progress, readable from any thread."""
+
+    def __init__(
+        self, repo_path: str, display_name: str = None, ignore_dirs: List[str] = None
+    ):
+        self.id = uuid.uuid4().hex[:8]
+        self.repo_path = repo_path
+        self.display_name = display_name or os.path.basename(os.path.abspath(repo_path))
+        self.ignore_dirs = ignore_dirs
+
+        self.status = "queued"  # queued -> running -> done | failed | cancelled
+        self.error: Optional[str] = None
+        self.index_dir: Optional[str] = None  # published version directory
+        self.progress: Dict[str, Any] = {}
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self._indexing_started: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def on_progress(self, progress: Dict[str, Any]):
+        if self._indexing_started is None and progress.get("stage") == "indexing":
+            self._indexing_started = time.time()
+        self.progress = progress
+
+    @property
+    def fraction(self) -> float:
+        total = self.progress.get("files_total") or 0
+        if not total:
+            return 1.0 if self.status == "done" else 0.0
+        return min(1.0, self.progress.get("files_parsed", 0) / total)
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        """Remaining time extrapolated from the file throughput so far."""
+        parsed = self.progress.get("files_parsed", 0)
+        total = self.progress.get("files_total", 0)
+        if not self._indexing_started or not parsed or parsed >= total:
+            return None
+        rate = parsed / max(time.time() - self._indexing_started, 1e-6)
+        return (total - parsed) / rate
+
+    def summary(self) -> str:
+        if self.status == "queued":
+            return f"⏳ {self.display_name}: queued"
+        if self.finished:
+            return f"{self.display_name}: {self.status}"
+        p = self.progress
+        text = (
+            f"🧠 {self.display_name}: {p.get('stage', 'starting')} - "
+            f"{p.get('files_parsed', 0)}/{p.get('files_total', '?')} files, "
+            f"{p.get('chunks_embedded', 0)} chunks embedded"
+        )
+        eta = self.eta_seconds
+        if eta is not None:
+            text += f", ETA {eta:.0f}s"
+        return text
+
+
+class IndexingWorker:
+    """
+    Runs index builds one at a time on a background thread.
+
+    Each build writes into a staged copy of the repository's current index and is
+    published atomically when it succeeds, so searches keep using the previous
+    version until then. Cancelled or failed builds leave the served index untouched.
+    """
+
+    def __init__(self, registry: IndexRegistry, use_mock_embedding: bool = False):
+        self.registry = registry
+        self.use_mock_embedding = use_mock_embedding
+        self._queue: "queue.Queue[IndexJob]" = queue.Queue()
+        self._jobs: Dict[str, IndexJob] = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name="indexing-worker"
+        )
+        self._thread.start()
+
+    def submit(
+        self, repo_path: str, display_name: str = None, ignore_dirs: List[str] = None
+    ) -> IndexJob:
+        """Queues a build; returns the existing job if this repo is already pending."""
+        with self._lock:
+            for job in self._jobs.values():
+                if not job.finished and os.path.abspath(job.repo_path) == os.path.abspath(
+                    repo_path
+                ):
+                    return job
+            job = IndexJob(repo_path, display_name, ignore_dirs)
+            self._jobs[job.id] = job
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[IndexJob]:
+        return sorted(self._jobs.values(), key=lambda j: j.created_at)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job.cancel_event.is_set():
+                job.status = "cancelled"
+                job.finished_at = time.time()
+                continue
+            try:
+                self._execute(job)
+            except Exception as e:  # never let one job kill the worker thread
+                job.status = "failed"
+                job.error = str(e)
+            job.finished_at = time.time()
+
+    def _execute(self, job: IndexJob):
+        job.status = "running"
+        job.started_at = time.time()
+
+        if self.registry.is_fresh(job.repo_path):
+            job.index_dir = self.registry.path_for(job.repo_path)
+            job.status = "done"
+            return
+
+        staged = self.registry.stage(job.repo_path)
+        # Sessions dropping an older version must not prune the build in progress
+        self.registry.acquire(staged)
+        try:
+            try:
+                builder = IndexBuilder(
+                    repo_path=job.repo_path,
+                    output_dir=staged,
+                    use_mock_embedding=self.use_mock_embedding,
+                    ignore_dirs=job.ignore_dirs,
+                    progress_callback=job.on_progress,
+                    cancel_event=job.cancel_event,
+                )
+                if repo_is_dirty(job.repo_path):
+                    # Uncommitted edits (or no git at all): compare files against the manifest
+                    builder.build()
+                else:
+                    # Clean checkout: only re-index what `git diff` says changed
+                    builder.update()
+
+                if not os.path.exists(os.path.join(staged, "bm25.bm25")):
+                    raise Exception(
+                        f"Indexing failed: '{staged}/bm25.bm25' was not created. Found 0 files?"
+                    )
+            except IndexingCancelled:
+                shutil.rmtree(staged, ignore_errors=True)
+                job.status = "cancelled"
+                return
+            except Exception as e:
+                shutil.rmtree(staged, ignore_errors=True)
+                job.status = "failed"
+                job.error = str(e)
+                return
+
+            self.registry.publish(job.repo_path, staged)
+            self.registry.touch(job.repo_path)
+            # Repositories with a queued or running build need their index as a base
+            active = [j.repo_path for j in self.jobs() if not j.finished]
+            self.registry.enforce_budget(keep=[job.repo_path] + active)
+            job.index_dir = staged
+            job.status = "done"
+        finally:
+            self.registry.release(staged)
@@ -1,65 +1,407 @@
 import json
 import os
-from typing import List
-from rank_bm25 import BM25Okapi
-import re
-from ..common.schema import CodeChunk
+from collections import Counter
+from typing import List, Dict, Iterable, Optional, Tuple
+import numpy as np
+from ..common.schema import CodeChunk, SearchResult
+from ..common.columnar import ChunkTable, read_arrays, write_arrays
+from .tokenizer import CodeTokenizer, CODE_STOPWORDS
+
+
+# 2: code-aware tokens (identifier splitting), tokenizer settings in the header
+FORMAT_VERSION = 2
+
+
+def index_file_path(path: str) -> str:
+    """Maps the historical `bm25.pkl` / `bm25.json` path to the binary index file."""
+    return os.path.splitext(path)[0] + ".bm25"
+
+
+class _SparseBM25:
+    """
+    Okapi BM25 (ATIRE idf with an epsilon floor, same as rank_bm25.BM25Okapi)
+    over a CSR term-document matrix: row t holds the postings of term t, and
+    each posting already stores its full idf * tf-saturation weight.
+    A query only touches the postings of its own terms.
+    """
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        tfs: np.ndarray,
+        data: np.ndarray,
+        idf: np.ndarray,
+        doc_len: np.ndarray,
+    ):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.indices = indices
+        self.tfs = tfs
+        self.data = data
+        self.idf = idf
+        self.doc_len = doc_len
+        self.n_docs = len(doc_len)
+
+    @classmethod
+    def from_stats(
+        cls,
+        doc_freqs: List[Dict[int, int]],
+        doc_len: List[int],
+        df: Dict[int, int],
+        terms: List[str],
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+    ) -> "_SparseBM25":
+        """
+        `doc_freqs` and `df` are keyed by interned term id (index into `terms`).
+        Ids whose terms no longer occur are dropped, so CSR rows are dense.
+        """
+        n_docs = len(doc_len)
+        row_of: Dict[int, int] = {term_id: i for i, term_id in enumerate(df)}
+        vocab: Dict[str, int] = {terms[term_id]: i for term_id, i in row_of.items()}
+
+        # idf per term row
+        doc_counts = np.fromiter(df.values(), dtype=np.float64, count=len(df))
+        idf = np.log(n_docs - doc_counts + 0.5) - np.log(doc_counts + 0.5)
+        if len(idf):
+            idf[idf < 0] = epsilon * idf.mean()
+
+        # COO triplets, then grouped by term into CSR
+        n_postings = sum(len(freqs) for freqs in doc_freqs)
+        rows = np.empty(n_postings, dtype=np.int32)
+        cols = np.empty(n_postings, dtype=np.int32)
+        tfs = np.empty(n_postings, dtype=np.float32)
+        pos = 0
+        for doc_id, freqs in enumerate(doc_freqs):
+            end = pos + len(freqs)
+            rows[pos:end] = [row_of[t] for t in freqs]
+            cols[pos:end] = doc_id
+            tfs[pos:end] = list(freqs.values())
+            pos = end
+
+        order = np.argsort(rows, kind="stable")
+        rows, cols, tfs = rows[order], cols[order], tfs[order]
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(vocab)), out=indptr[1:])
+
+        lengths = np.asarray(doc_len, dtype=np.int32)
+        avgdl = lengths.mean() if n_docs else 1.0
+        norm = k1 * (1 - b + b * lengths / max(avgdl, 1e-9))
+        data = (idf[rows] * (tfs * (k1 + 1) / (tfs + norm[cols]))).astype(np.float32)
+
+        return cls(vocab, indptr, cols, tfs, data, idf.astype(np.float32), lengths)
+
+    def get_scores(self, query_terms: List[str]) -> np.ndarray:
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term, count in Counter(query_terms).items():
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            # Doc ids are unique within a row, so fancy-index += is safe
+            scores[self.indices[start:end]] += count * self.data[start:end]
+        return scores
+
+    def get_scores_many(self, queries: List[List[str]]) -> np.ndarray:
+        """
+        Scores of several queries (one row each) in one pass: the postings of all
+        their terms are gathered together and summed with a single bincount.
+        """
+        n_queries = len(queries)
+        owners, starts, ends, counts = [], [], [], []
+        for q, query_terms in enumerate(queries):
+            for term, count in Counter(query_terms).items():
+                term_id = self.vocab.get(term)
+                if term_id is not None:
+                    owners.append(q)
+                    starts.append(self.indptr[term_id])
+                    ends.append(self.indptr[term_id + 1])
+                    counts.append(count)
+        if not owners:
+            return np.zeros((n_queries, self.n_docs), dtype=np.float32)
+
+        # Ragged gather of every posting range: positions start..end-1 per term
+        starts = np.asarray(starts, dtype=np.int64)
+        lengths = np.asarray(ends, dtype=np.int64) - starts
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.arange(lengths.sum()) + np.repeat(starts - offsets, lengths)
+        rows = np.repeat(np.asarray(owners, dtype=np.int64), lengths)
+        weights = self.data[positions] * np.repeat(np.asarray(counts, np.float32), lengths)
+
+        scores = np.bincount(
+            rows * self.n_docs + self.indices[positions],
+            weights=weights,
+            minlength=n_queries * self.n_docs,
+        )
+        return scores.reshape(n_queries, self.n_docs).astype(np.float32)
+
+    def top_k(self, query_terms: List[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices and scores of the best `k` documents containing any query term."""
+        return _best(self.get_scores(query_terms), k)
+
+    def top_k_many(
+        self, queries: List[List[str]], k: int
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """`top_k` for several queries, scored in batches of dense score rows."""
+        # 2^23 cells: a 64 MiB float64 bincount block (plus its float32 copy)
+        step = max(1, (1 << 23) // max(1, self.n_docs))
+        results = []
+        for offset in range(0, len(queries), step):
+            block = self.get_scores_many(queries[offset : offset + step])
+            results.extend(_best(scores, k) for scores in block)
+        return results
+
+
+def _best(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Best `k` non-zero entries of a score row, highest first."""
+    candidates = np.flatnonzero(scores)
+    if len(candidates) > k:
+        part = np.argpartition(scores[candidates], -k)[-k:]
+        candidates = candidates[part]
+    order = np.argsort(-scores[candidates], kind="stable")
+    candidates = candidates[order]
+    return candidates, scores[candidates]
 
 
 class BM25Retriever:
-    def __init__(self):
+    """
+    Two states:
+    - mutable (index/add/remove_files): Python term statistics, used while building
+    - loaded (load): CSR arrays and a ChunkTable memory-mapped from the index file,
+      no tokenization or CodeChunk validation at startup
+    Mutating a loaded index converts it back to the mutable state first.
+    """
+
+    def __init__(self, tokenizer: CodeTokenizer = None):
         self.bm25 = None
         self.chunks = []
+        self.tokenizer = tokenizer or default_tokenizer()
+        # Statistics are accumulated incrementally so chunks can be streamed in
+        # and removed without re-tokenizing the whole corpus. Terms are interned:
+        # statistics hold small int ids, the strings live once in `terms`.
+        self.terms: List[str] = []
+        self.term_ids: Dict[str, int] = {}
+        self.doc_freqs: List[Dict[int, int]] = []
+        self.doc_len: List[int] = []
+        self.df: Dict[int, int] = {}  # term id -> number of documents containing it
+        self._loaded = False
+        self._rows_by_id: Dict[str, int] = None
 
     def index(self, chunks: List[CodeChunk]):
-        self.chunks = chunks
-        tokenized_corpus = [self._tokenize(chunk.content) for chunk in chunks]
-        self.bm25 = BM25Okapi(tokenized_corpus)
+        self.chunks = []
+        self.terms, self.term_ids = [], {}
+        self.doc_freqs = []
+        self.doc_len = []
+        self.df = {}
+        self._loaded = False
+        self.add(chunks)
+
+    def add(self, chunks: Iterable[CodeChunk]):
+        """Appends chunks to the corpus, updating term statistics."""
+        self._thaw()
+        for chunk in chunks:
+            tokens = self._tokenize(chunk.content)
+            freqs = dict(Counter(self._intern(tokens)))
+            for term_id in freqs:
+                self.df[term_id] = self.df.get(term_id, 0) + 1
+            self.doc_freqs.append(freqs)
+            self.doc_len.append(len(tokens))
+            self.chunks.append(chunk)
+        self.bm25 = None
+        self._rows_by_id = None
+
+    def remove_files(self, file_paths: Iterable[str]):
+        """Drops every chunk that belongs to one of `file_paths`."""
+        removed = set(file_paths)
+        if not removed:
+            return
+        if self._loaded and not removed.intersection(self.chunks.paths):
+            return
+        self._thaw()
+
+        keep = [i for i, c in enumerate(self.chunks) if c.file_path not in removed]
+        if len(keep) == len(self.chunks):
+            return
+
+        kept = set(keep)
+        for i, freqs in enumerate(self.doc_freqs):
+            if i in kept:
+                continue
+            for term_id in freqs:
+                self.df[term_id] -= 1
+                if not self.df[term_id]:
+                    del self.df[term_id]
 
-    def search(self, query: str, top_k: int = 5) -> List[CodeChunk]:
+        self.chunks = [self.chunks[i] for i in keep]
+        self.doc_freqs = [self.doc_freqs[i] for i in keep]
+        self.doc_len = [self.doc_len[i] for i in keep]
+        self.bm25 = None
+        self._rows_by_id = None
+
+    def search(self, query: str, top_k: int = 5) -> List[SearchResult]:
         if not self.bm25:
-            # Try to lazy load or raise error
-            raise ValueError("Index not built! Call load() first.")
+            if not self.chunks:
+                # Try to lazy load or raise error
+                raise ValueError("Index not built! Call load() first.")
+            self.bm25 = self._build_scorer()
 
-        tokenized_query = self._tokenize(query)
-        scores = self.bm25.get_scores(tokenized_query)
-        top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[
-            :top_k
+        indices, scores = self.bm25.top_k(self._tokenize(query), top_k)
+        return [
+            SearchResult(chunk=self.chunks[i], score=float(score), source="bm25")
+            for i, score in zip(indices, scores)
         ]
 
-        return [self.chunks[i] for i in top_indices]
+    def search_many(self, queries: List[str], top_k: int = 5) -> List[List[SearchResult]]:
+        """`search` for several queries, scored together (see `_SparseBM25.top_k_many`)."""
+        if not self.bm25:
+            if not self.chunks:
+                raise ValueError("Index not built! Call load() first.")
+            self.bm25 = self._build_scorer()
+
+        ranked = self.bm25.top_k_many([self._tokenize(q) for q in queries], top_k)
+        return [
+            [
+                SearchResult(chunk=self.chunks[i], score=float(score), source="bm25")
+                for i, score in zip(indices, scores)
+            ]
+            for indices, scores in ranked
+        ]
+
+    def get_chunks(self, chunk_ids: Iterable[str]) -> List[CodeChunk]:
+        """Chunks by id (unknown ids are skipped), via a lazily built id -> row map."""
+        rows = self._id_rows()
+        return [self.chunks[rows[cid]] for cid in chunk_ids if cid in rows]
+
+    def get_chunk(self, chunk_id: str) -> Optional[CodeChunk]:
+        row = self._id_rows().get(chunk_id)
+        return None if row is None else self.chunks[row]
+
+    def _id_rows(self) -> Dict[str, int]:
+        if self._rows_by_id is None:
+            ids = (
+                self.chunks.ids.to_list()
+                if isinstance(self.chunks, ChunkTable)
+                else [c.id for c in self.chunks]
+            )
+            self._rows_by_id = {cid: i for i, cid in enumerate(ids)}
+        return self._rows_by_id
 
     def _tokenize(self, text: str) -> List[str]:
-        return [w.lower() for w in re.findall(r"\w+", text)]
+        return self.tokenizer.tokenize(text)
+
+    def _intern(self, tokens: List[str]) -> List[int]:
+        term_ids = self.term_ids
+        ids = []
+        for token in tokens:
+            term_id = term_ids.get(token)
+            if term_id is None:
+                term_id = term_ids[token] = len(self.terms)
+                self.terms.append(token)
+            ids.append(term_id)
+        return ids
+
+    def _build_scorer(self) -> "_SparseBM25":
+        return _SparseBM25.from_stats(self.doc_freqs, self.doc_len, self.df, self.terms)
 
     def save(self, path: str):
-        # We NO LONGER pickle the BM25 object. We only save the data as JSON.
-        # This completely eliminates pickle errors.
-        json_path = path.replace(".pkl", ".json")
+        """
+        Writes the binary index (`bm25.pkl` -> `bm25.bm25`): vocabulary, CSR postings,
+        doc lengths, idf and the chunk columns, all as flat arrays.
+        """
+        if self.bm25 is None and self.chunks:
+            self.bm25 = self._build_scorer()
+
+        table = (
+            self.chunks
+            if isinstance(self.chunks, ChunkTable)
+            else ChunkTable.from_chunks(self.chunks)
+        )
+        header, arrays = table.to_arrays()
+        header["version"] = FORMAT_VERSION
+        header["tokenizer"] = self.tokenizer.config()
 
-        # Serialize chunks to primitive dicts
-        chunks_data = [c.model_dump(mode="json") for c in self.chunks]
+        bm25 = self.bm25 or _SparseBM25.from_stats([], [], {}, [])
+        # Tokens are pieces of \w+ runs, so a newline can never appear inside a term
+        arrays["bm25.vocab"] = np.frombuffer(
+            "\n".join(bm25.vocab).encode("utf-8"), dtype=np.uint8
+        )
+        arrays["bm25.indptr"] = bm25.indptr
+        arrays["bm25.indices"] = bm25.indices
+        arrays["bm25.tfs"] = bm25.tfs
+        arrays["bm25.data"] = bm25.data
+        arrays["bm25.idf"] = bm25.idf
+        arrays["bm25.doc_len"] = bm25.doc_len
 
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(chunks_data, f, ensure_ascii=False, indent=2)
+        write_arrays(index_file_path(path), arrays, header)
 
-    def load(self, path: str):
-        # Load from JSON and REBUILD the index in-memory (it's fast)
+    def load(self, path: str, use_mmap: bool = True):
+        index_path = index_file_path(path)
         json_path = path.replace(".pkl", ".json")
 
-        if not os.path.exists(json_path):
-            # Fallback check for old pkl just in case, but prioritize JSON
+        if not os.path.exists(index_path):
+            if os.path.exists(json_path):
+                # Older JSON format: rebuild the statistics once, slowly
+                print(f"⚠️ Loading legacy JSON index {json_path}, please rebuild.")
+                with open(json_path, "r", encoding="utf-8") as f:
+                    self.index([CodeChunk(**c) for c in json.load(f)])
+                return
+            # Fallback check for old pkl just in case
             if os.path.exists(path):
                 print(
-                    f"⚠️ Legacy pickle found at {path}, but JSON expected. Please rebuild index."
+                    f"⚠️ Legacy pickle found at {path}, but {index_path} expected. Please rebuild index."
                 )
-            raise FileNotFoundError(f"Index data not found at {json_path}")
+            raise FileNotFoundError(f"Index data not found at {index_path}")
+
+        header, arrays = read_arrays(index_path, use_mmap=use_mmap)
+        if header.get("version") != FORMAT_VERSION:
+            raise FileNotFoundError(
+                f"Index {index_path} has an unsupported format, please rebuild."
+            )
+
+        vocab_blob = arrays["bm25.vocab"].tobytes().decode("utf-8")
+        terms = vocab_blob.split("\n") if vocab_blob else []
+        self.chunks = ChunkTable.from_arrays(header, arrays)
+        self.tokenizer = CodeTokenizer.from_config(header["tokenizer"])
+        self.bm25 = _SparseBM25(
+            vocab=dict(zip(terms, range(len(terms)))),
+            indptr=arrays["bm25.indptr"],
+            indices=arrays["bm25.indices"],
+            tfs=arrays["bm25.tfs"],
+            data=arrays["bm25.data"],
+            idf=arrays["bm25.idf"],
+            doc_len=arrays["bm25.doc_len"],
+        )
+        self.doc_freqs, self.doc_len, self.df = [], [], {}
+        self.terms, self.term_ids = [], {}
+        self._loaded = True
+        self._rows_by_id = None
+
+    def _thaw(self):
+        """Rebuilds the mutable statistics from the loaded CSR arrays (no re-tokenizing)."""
+        if not self._loaded:
+            return
+        bm25 = self.bm25
+        # Loaded CSR rows become the interned term ids
+        self.terms = list(bm25.vocab)
+        self.term_ids = dict(bm25.vocab)
+        counts = np.diff(bm25.indptr)
 
-        with open(json_path, "r", encoding="utf-8") as f:
-            chunks_data = json.load(f)
+        self.doc_freqs = [{} for _ in range(bm25.n_docs)]
+        rows = np.repeat(np.arange(len(self.terms)), counts)
+        for term_id, doc_id, tf in zip(
+            rows.tolist(), bm25.indices.tolist(), bm25.tfs.tolist()
+        ):
+            self.doc_freqs[doc_id][term_id] = int(tf)
+        self.doc_len = bm25.doc_len.tolist()
+        self.df = dict(zip(range(len(self.terms)), counts.tolist()))
+        self.chunks = list(self.chunks)
+        self._loaded = False
 
-        # Reconstruct objects
-        self.chunks = [CodeChunk(**c) for c in chunks_data]
 
-        # Rebuild BM25 on the fly
-        self.index(self.chunks)
+def default_tokenizer() -> CodeTokenizer:
+    """Code-aware tokenizer; BM25_STOPWORDS=1 also drops common language keywords."""
+    stopwords = CODE_STOPWORDS if os.getenv("BM25_STOPWORDS", "0") == "1" else None
+    return CodeTokenizer(stopwords=stopwords)
@@ -1,7 +1,16 @@
-from typing import List, Dict
-from .bm25 import BM25Retriever
+import os
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import List, Dict, Tuple, Any
+from .bm25 import BM25Retriever, index_file_path
+from .cache import QueryCache, normalize_query
+from .symbols import SymbolIndex, SYMBOLS_FILE
 from .vector import VectorRetriever
+from .vector_store import vector_store_files
 from ..common.schema import SearchResult, CodeChunk
+from ..indexer.embeddings import EmbeddingService
+from ..indexer.registry import IndexRegistry
 
 
 class HybridRetriever:
@@ -10,17 +19,73 @@ class HybridRetriever:
         bm25_path: str = "data/bm25.pkl",
         qdrant_path: str = "data/qdrant",
         use_mock_embedding: bool = True,
+        embedding_service: EmbeddingService = None,
+        bm25_timeout: float = 5.0,
+        vector_timeout: float = None,
+        cache_size: int = None,
+        cache_ttl: float = None,
     ):
         # Initialize BM25
+        self.bm25_path = bm25_path
         self.bm25 = BM25Retriever()
         try:
             self.bm25.load(bm25_path)
         except FileNotFoundError:
             print(f"⚠️ BM25 index not found at {bm25_path}. BM25 search will fail.")
 
+        # Symbol table for direct definition/reference lookups (empty for old indexes)
+        self.symbols = SymbolIndex.load_or_empty(
+            os.path.join(os.path.dirname(bm25_path), SYMBOLS_FILE)
+        )
+
         # Initialize Vector Store
+        self.qdrant_path = qdrant_path
         self.vector = VectorRetriever(
-            storage_path=qdrant_path, use_mock_embedding=use_mock_embedding
+            storage_path=qdrant_path,
+            embedding_service=embedding_service,
+            use_mock_embedding=use_mock_embedding,
+            chunk_store=self.bm25,
+        )
+
+        # Per-leg deadlines (seconds, measured from the start of the search).
+        # A leg that misses its deadline is dropped from the fusion, so a slow
+        # embedding provider degrades to BM25-only results instead of blocking.
+        self.timeouts = {
+            "bm25": bm25_timeout,
+            "vector": vector_timeout or float(os.getenv("VECTOR_SEARCH_TIMEOUT", 10)),
+        }
+        # Timed-out legs keep running in the background, so leave headroom
+        self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+        self.last_timings: Dict[str, float] = {}
+
+        # Repeated queries (agent retries, UI reruns) skip both legs entirely.
+        # Entries belong to one index version and are dropped when it changes.
+        self.cache = QueryCache(
+            max_items=(
+                cache_size
+                if cache_size is not None
+                else int(os.getenv("QUERY_CACHE_SIZE", 512))
+            ),
+            ttl=(
+                cache_ttl
+                if cache_ttl is not None
+                else float(os.getenv("QUERY_CACHE_TTL", 600))
+            ),
+        )
+        self.index_version = self._index_version()
+
+    @classmethod
+    def for_repo(
+        cls, repo_path: str, registry: IndexRegistry = None, **kwargs
+    ) -> "HybridRetriever":
+        """Opens the index stored for `repo_path` in the index registry."""
+        registry = registry or IndexRegistry()
+        index_dir = registry.path_for(repo_path)
+        registry.touch(repo_path)
+        return cls(
+            bm25_path=os.path.join(index_dir, "bm25.pkl"),
+            qdrant_path=os.path.join(index_dir, "qdrant"),
+            **kwargs,
         )
 
     def search(self, query: str, top_k: int = 5, k: int = 60) -> List[SearchResult]:
@@ -31,26 +96,193 @@ class HybridRetriever:
             query: The search query string.
             top_k: Number of final results to return.
             k: RRF constant (usually 60).
+
+        Latencies of the last call (ms) are kept in `last_timings`.
+        Results are cached per (normalized query, top_k, k) and index version.
         """
-        # 1. Parallel Retrieval (Sequential for now)
-        try:
-            # BM25 returns raw CodeChunks, wrap them in SearchResult
-            bm25_chunks = self.bm25.search(query, top_k=top_k * 2)
-            bm25_results = [
-                SearchResult(chunk=c, score=0.0, source="bm25") for c in bm25_chunks
-            ]
-        except Exception as e:
-            print(f"⚠️ BM25 search failed: {e}")
-            bm25_results = []
+        start = time.perf_counter()
+        self._check_index_version()
 
-        try:
-            vector_results = self.vector.search(query, top_k=top_k * 2)
-        except Exception as e:
-            print(f"⚠️ Vector search failed: {e}")
-            vector_results = []
+        cache_key = (self.index_version, normalize_query(query), top_k, k)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            self.last_timings = {"cache": (time.perf_counter() - start) * 1000}
+            self.last_timings["total"] = self.last_timings["cache"]
+            return list(cached)
+
+        # 1. Parallel Retrieval: total latency is max(BM25, vector), not the sum
+        results, timings, complete = self._run_legs(
+            start,
+            (self.bm25.search, query, top_k * 2),
+            (self.vector.search, query, top_k * 2),
+            empty=[],
+        )
 
         # 2. RRF Fusion
-        return self._rrf_fusion(bm25_results, vector_results, k=k, limit=top_k)
+        fusion_start = time.perf_counter()
+        fused = self._rrf_fusion(results["bm25"], results["vector"], k=k, limit=top_k)
+        timings["fusion"] = (time.perf_counter() - fusion_start) * 1000
+
+        # Degraded (partial) results are not cached, the next call retries both legs
+        if complete:
+            self.cache.put(cache_key, list(fused))
+
+        timings["total"] = (time.perf_counter() - start) * 1000
+        self.last_timings = timings
+        return fused
+
+    def search_many(
+        self, queries: List[str], top_k: int = 5, k: int = 60
+    ) -> List[List[SearchResult]]:
+        """
+        `search` for several queries at once, results in the same order.
+
+        Cached and duplicate queries are answered without retrieval; the rest go
+        through one BM25 pass (`BM25Retriever.search_many`), one embedding call and
+        one batched vector query, then are fused per query. `last_timings` covers
+        the whole batch.
+        """
+        start = time.perf_counter()
+        self._check_index_version()
+
+        keys = [(self.index_version, normalize_query(q), top_k, k) for q in queries]
+        found: Dict[Tuple, List[SearchResult]] = {}
+        pending: Dict[Tuple, str] = {}
+        for key, query in zip(keys, queries):
+            if key in found or key in pending:
+                continue
+            cached = self.cache.get(key)
+            if cached is not None:
+                found[key] = list(cached)
+            else:
+                pending[key] = query
+
+        timings: Dict[str, float] = {}
+        if pending:
+            batch = list(pending.values())
+            results, timings, complete = self._run_legs(
+                start,
+                (self.bm25.search_many, batch, top_k * 2),
+                (self.vector.search_many, batch, top_k * 2),
+                empty=[[] for _ in batch],
+            )
+            fusion_start = time.perf_counter()
+            for i, key in enumerate(pending):
+                fused = self._rrf_fusion(
+                    results["bm25"][i], results["vector"][i], k=k, limit=top_k
+                )
+                if complete:
+                    self.cache.put(key, list(fused))
+                found[key] = fused
+            timings["fusion"] = (time.perf_counter() - fusion_start) * 1000
+
+        timings["total"] = (time.perf_counter() - start) * 1000
+        self.last_timings = timings
+        return [list(found[key]) for key in keys]
+
+    def _run_legs(
+        self, start: float, bm25_call: Tuple, vector_call: Tuple, empty: Any
+    ) -> Tuple[Dict[str, Any], Dict[str, float], bool]:
+        """
+        Runs the BM25 and vector calls (`(fn, *args)`) concurrently, each against
+        its deadline. Returns the results per leg (`empty` for a leg that timed out
+        or failed), their timings and whether both legs completed.
+        """
+        legs = {
+            "bm25": self._pool.submit(_timed, *bm25_call),
+            "vector": self._pool.submit(_timed, *vector_call),
+        }
+
+        results: Dict[str, Any] = {}
+        timings: Dict[str, float] = {}
+        complete = True
+        for name, future in legs.items():
+            remaining = self.timeouts[name] - (time.perf_counter() - start)
+            try:
+                results[name], timings[name] = future.result(timeout=max(0.0, remaining))
+            except FutureTimeout:
+                print(
+                    f"⚠️ {name} search timed out after {self.timeouts[name]:.1f}s, "
+                    "continuing without it."
+                )
+                results[name] = empty
+                complete = False
+            except Exception as e:
+                print(f"⚠️ {name} search failed: {e}")
+                results[name] = empty
+                complete = False
+        return results, timings, complete
+
+    def find_definitions(
+        self, name: str, prefix: bool = False, limit: int = 10, k: int = 60
+    ) -> List[SearchResult]:
+        """
+        Chunks defining `name` (`func`, `Class` or `Class.method`), straight from the
+        symbol index: no embedding. Hits are scored like one RRF list (1 / (k + rank)),
+        so they can be ranked together with `search` results.
+        """
+        ids = self.symbols.definitions(name, prefix=prefix, limit=limit)
+        return _symbol_results(self.bm25.get_chunks(ids), k)
+
+    def find_references(
+        self, name: str, limit: int = 10, k: int = 60
+    ) -> List[SearchResult]:
+        """Functions that call `name` (scored like `find_definitions`)."""
+        ids = self.symbols.references(name, limit=limit)
+        return _symbol_results(self.bm25.get_chunks(ids), k)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit rate and size of the query-result cache."""
+        return {**self.cache.stats(), "index_version": self.index_version}
+
+    @property
+    def index_key(self) -> str:
+        """Short stable id of the index version, usable as a persistent cache namespace."""
+        return hashlib.sha1(repr(self.index_version).encode("utf-8")).hexdigest()[:16]
+
+    def _index_version(self) -> Tuple:
+        """Identifies the index files on disk; changes whenever a build rewrites them."""
+        index_dir = os.path.dirname(self.bm25_path)
+        version = []
+        for path in (
+            index_file_path(self.bm25_path),
+            os.path.join(index_dir, "manifest.json"),
+            *vector_store_files(
+                os.path.dirname(self.qdrant_path), self.vector.collection_name
+            ),
+        ):
+            try:
+                stat = os.stat(path)
+                version.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                version.append(None)
+        return tuple(version)
+
+    def _check_index_version(self):
+        """Drops cached results and reopens the index if it was rebuilt in place."""
+        version = self._index_version()
+        if version == self.index_version:
+            return
+        self.cache.invalidate()
+        self.index_version = version
+        try:
+            self.bm25.load(self.bm25_path)
+        except FileNotFoundError:
+            pass
+        self.symbols = SymbolIndex.load_or_empty(
+            os.path.join(os.path.dirname(self.bm25_path), SYMBOLS_FILE)
+        )
+        # The old store still maps the replaced matrix (or holds Qdrant's lock);
+        # close it first, then open whatever the new build left
+        embedding_service = self.vector.embedding_service
+        collection_name = self.vector.collection_name
+        self.vector.close()
+        self.vector = VectorRetriever(
+            storage_path=self.qdrant_path,
+            collection_name=collection_name,
+            embedding_service=embedding_service,
+            chunk_store=self.bm25,
+        )
 
     def _rrf_fusion(
         self,
@@ -99,5 +331,21 @@ class HybridRetriever:
 
     def close(self):
         """Release resources."""
+        self._pool.shutdown(wait=False)
         if self.vector:
             self.vector.close()
+
+
+def _timed(fn, *args) -> Tuple[Any, float]:
+    """Runs `fn` and returns its result together with the elapsed milliseconds."""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def _symbol_results(chunks: List[CodeChunk], k: int) -> List[SearchResult]:
+    """Symbol-index hits in index order, with the score of one RRF list."""
+    return [
+        SearchResult(chunk=chunk, score=1.0 / (k + rank + 1), source="symbol")
+        for rank, chunk in enumerate(chunks)
+    ]
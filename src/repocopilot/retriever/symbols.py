@@ -0,0 +1,150 @@
+import os
+import bisect
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+
+from ..common.schema import CodeChunk, ChunkType
+from ..common.columnar import StringColumn, read_arrays, write_arrays
+
+FORMAT_VERSION = 1
+SYMBOLS_FILE = "symbols.idx"
+
+_DEFINITION_TYPES = (ChunkType.FUNCTION, ChunkType.CLASS)
+
+
+class SymbolIndex:
+    """
+    Name -> chunk id tables built from the parser's function/class chunks:
+    - definitions: `name` and `Parent.name` for methods
+    - references: callee names recorded in `metadata["calls"]`
+
+    Exact lookups are dict hits; prefix lookups bisect a sorted name list.
+    Like BM25Retriever, it is patched per file during incremental builds.
+    """
+
+    def __init__(self):
+        # chunk id -> (file path, defined names, called names)
+        self.entries: Dict[str, Tuple[str, List[str], List[str]]] = {}
+        self._definitions: Dict[str, List[str]] = None
+        self._references: Dict[str, List[str]] = None
+        self._sorted_names: List[str] = None
+
+    def add(self, chunks: Iterable[CodeChunk]):
+        for chunk in chunks:
+            names = []
+            if chunk.name and ChunkType(chunk.type) in _DEFINITION_TYPES:
+                names.append(chunk.name)
+                if chunk.parent_name:
+                    names.append(f"{chunk.parent_name}.{chunk.name}")
+            calls = list(chunk.metadata.get("calls", ()))
+            if names or calls:
+                self.entries[chunk.id] = (chunk.file_path, names, calls)
+        self._invalidate()
+
+    def remove_files(self, file_paths: Iterable[str]):
+        removed = set(file_paths)
+        if not removed:
+            return
+        self.entries = {
+            cid: entry for cid, entry in self.entries.items() if entry[0] not in removed
+        }
+        self._invalidate()
+
+    def definitions(self, name: str, prefix: bool = False, limit: int = 20) -> List[str]:
+        """Chunk ids defining `name` (or `Class.name`); with `prefix`, any name starting with it."""
+        self._ensure_tables()
+        if not prefix:
+            return self._definitions.get(name, [])[:limit]
+
+        found = []
+        start = bisect.bisect_left(self._sorted_names, name)
+        for key in self._sorted_names[start:]:
+            if not key.startswith(name) or len(found) >= limit:
+                break
+            found.extend(cid for cid in self._definitions[key] if cid not in found)
+        return found[:limit]
+
+    def references(self, name: str, limit: int = 20) -> List[str]:
+        """Chunk ids of functions that call `name`."""
+        self._ensure_tables()
+        return self._references.get(name, [])[:limit]
+
+    def __contains__(self, name: str) -> bool:
+        self._ensure_tables()
+        return name in self._definitions
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def save(self, path: str):
+        ids = list(self.entries)
+        files = sorted({entry[0] for entry in self.entries.values()})
+        file_ids = {f: i for i, f in enumerate(files)}
+
+        arrays = {
+            "chunk_file": np.array(
+                [file_ids[self.entries[cid][0]] for cid in ids], dtype=np.int32
+            )
+        }
+        column = StringColumn.pack(ids)
+        arrays["ids.blob"], arrays["ids.offsets"] = column.blob, column.offsets
+        for kind, slot in (("defs", 1), ("calls", 2)):
+            # Per-chunk name lists as CSR: names of chunk i are flat[indptr[i]:indptr[i+1]]
+            lists = [self.entries[cid][slot] for cid in ids]
+            indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+            np.cumsum([len(names) for names in lists], out=indptr[1:])
+            names = StringColumn.pack([name for names in lists for name in names])
+            arrays[f"{kind}.indptr"] = indptr
+            arrays[f"{kind}.blob"], arrays[f"{kind}.offsets"] = names.blob, names.offsets
+
+        write_arrays(path, arrays, {"version": FORMAT_VERSION, "files": files})
+
+    @classmethod
+    def load(cls, path: str) -> "SymbolIndex":
+        header, arrays = read_arrays(path, use_mmap=False)
+        if header.get("version") != FORMAT_VERSION:
+            raise FileNotFoundError(f"Symbol index {path} has an unsupported format.")
+
+        files = header["files"]
+        ids = StringColumn(arrays["ids.blob"], arrays["ids.offsets"]).to_list()
+        lists = {}
+        for kind in ("defs", "calls"):
+            flat = StringColumn(
+                arrays[f"{kind}.blob"], arrays[f"{kind}.offsets"]
+            ).to_list()
+            indptr = arrays[f"{kind}.indptr"].tolist()
+            lists[kind] = [flat[indptr[i] : indptr[i + 1]] for i in range(len(ids))]
+
+        index = cls()
+        index.entries = {
+            cid: (files[f], lists["defs"][i], lists["calls"][i])
+            for i, (cid, f) in enumerate(zip(ids, arrays["chunk_file"].tolist()))
+        }
+        return index
+
+    @classmethod
+    def load_or_empty(cls, path: str) -> "SymbolIndex":
+        if os.path.exists(path):
+            try:
+                return cls.load(path)
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable symbol index {path}: {e}")
+        return cls()
+
+    def _invalidate(self):
+        self._definitions = self._references = self._sorted_names = None
+
+    def _ensure_tables(self):
+        if self._definitions is not None:
+            return
+        definitions: Dict[str, List[str]] = {}
+        references: Dict[str, List[str]] = {}
+        for cid, (_, names, calls) in self.entries.items():
+            for name in names:
+                definitions.setdefault(name, []).append(cid)
+            for name in calls:
+                references.setdefault(name, []).append(cid)
+        self._definitions = definitions
+        self._references = references
+        self._sorted_names = sorted(definitions)
+
@@ -0,0 +1,80 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple, Any
+
+# Identifier-ish runs, then the camelCase / acronym / digit pieces inside one
+_WORD = re.compile(r"\w+")
+_PART = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+# Keywords common to the indexed languages; they carry almost no signal in code search
+CODE_STOPWORDS = frozenset(
+    """
+    and as assert async await break case catch class const continue def default del
+    do elif else enum export extends false final finally fn for from func function
+    go if impl import in interface is let local mut new nil none not null or package
+    pass private protected pub public raise return self static struct super switch
+    then this throw true try type use var void while with yield
+    """.split()
+)
+
+
+class CodeTokenizer:
+    """
+    BM25 tokenizer for source code. Each `\\w+` run is emitted lowercased and, when it
+    is a compound identifier, followed by its camelCase/snake_case parts:
+
+        getUserName -> getusername, get, user, name
+        HTTP_SERVER -> http_server, http, server
+
+    so both the exact identifier and its words match. Expansions are memoized per
+    distinct word, which makes re-tokenizing repetitive code mostly dict lookups.
+    """
+
+    def __init__(
+        self,
+        split_identifiers: bool = True,
+        stopwords: Optional[Iterable[str]] = None,
+        min_part_length: int = 2,
+        cache_size: int = 200_000,
+    ):
+        self.split_identifiers = split_identifiers
+        self.stopwords = frozenset(stopwords or ())
+        self.min_part_length = min_part_length
+        self.cache_size = cache_size
+        self._cache: Dict[str, Tuple[str, ...]] = {}
+
+    def tokenize(self, text: str) -> List[str]:
+        cache = self._cache
+        tokens: List[str] = []
+        for word in _WORD.findall(text):
+            expansion = cache.get(word)
+            if expansion is None:
+                expansion = self._expand(word)
+                if len(cache) >= self.cache_size:
+                    cache.clear()
+                cache[word] = expansion
+            tokens.extend(expansion)
+        return tokens
+
+    def _expand(self, word: str) -> Tuple[str, ...]:
+        lower = word.lower()
+        tokens = [] if lower in self.stopwords else [lower]
+        if self.split_identifiers:
+            parts = _PART.findall(word)
+            if len(parts) > 1:
+                for part in parts:
+                    part = part.lower()
+                    if len(part) >= self.min_part_length and part not in self.stopwords:
+                        tokens.append(part)
+        return tuple(tokens)
+
+    def config(self) -> Dict[str, Any]:
+        """Settings stored with the index, so queries are tokenized the same way."""
+        return {
+            "split_identifiers": self.split_identifiers,
+            "stopwords": sorted(self.stopwords),
+            "min_part_length": self.min_part_length,
+        }
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "CodeTokenizer":
+        return cls(**config)
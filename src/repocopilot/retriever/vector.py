@@ -1,7 +1,8 @@
-from typing import List
-from qdrant_client import QdrantClient
+import os
+from typing import List, Optional
 from ..common.schema import CodeChunk, SearchResult
 from ..indexer.embeddings import EmbeddingService, get_embedding_service
+from .vector_store import open_vector_store
 
 
 class VectorRetriever:
@@ -11,8 +12,19 @@ class VectorRetriever:
         collection_name: str = "repo_code",
         embedding_service: EmbeddingService = None,
         use_mock_embedding: bool = True,
+        chunk_store=None,
+        backend: str = None,
     ):
-        self.client = QdrantClient(path=storage_path)
+        # `storage_path` is the Qdrant directory inside the index; the NumPy backend
+        # keeps its matrix next to it and is picked automatically when present
+        self.store = open_vector_store(
+            os.path.dirname(storage_path) or ".",
+            backend=backend,
+            collection_name=collection_name,
+        )
+        # Anything with `get_chunk(id)` (the BM25 retriever's chunk table): payloads
+        # only carry the chunk id, the content is read from there
+        self.chunk_store = chunk_store
         self.collection_name = collection_name
         self.embedding_service = embedding_service or get_embedding_service(
             use_mock=use_mock_embedding
@@ -26,27 +38,61 @@ class VectorRetriever:
             print(f"⚠️ Embedding generation failed: {e}")
             return []
 
-        # 2. Search in Qdrant using query_points (modern API)
+        # 2. Nearest neighbours in the vector store
         try:
-            results = self.client.query_points(
-                collection_name=self.collection_name, query=query_vector, limit=top_k
-            ).points
+            hits = self.store.search([query_vector], top_k)[0]
         except Exception as e:
             # Gracefully handle missing collection or connection errors
             print(f"⚠️ Vector search failed: {e}")
             return []
 
         # 3. Convert to SearchResult
-        search_results = []
-        for res in results:
-            chunk = CodeChunk(id=str(res.id), **res.payload)
-            search_results.append(
-                SearchResult(chunk=chunk, score=res.score, source="vector")
-            )
+        return self._to_results(hits)
+
+    def search_many(self, queries: List[str], top_k: int = 5) -> List[List[SearchResult]]:
+        """`search` for several queries: one embedding call and one batched store query."""
+        if not queries:
+            return []
+        try:
+            query_vectors = self.embedding_service.get_embeddings(list(queries))
+        except Exception as e:
+            print(f"⚠️ Embedding generation failed: {e}")
+            return [[] for _ in queries]
 
+        try:
+            batches = self.store.search(query_vectors, top_k)
+        except Exception as e:
+            print(f"⚠️ Vector search failed: {e}")
+            return [[] for _ in queries]
+
+        return [self._to_results(hits) for hits in batches]
+
+    def _to_results(self, hits) -> List[SearchResult]:
+        search_results = []
+        for chunk_id, score, payload in hits:
+            chunk = self._resolve(chunk_id, payload)
+            if chunk is not None:
+                search_results.append(
+                    SearchResult(chunk=chunk, score=score, source="vector")
+                )
         return search_results
 
+    def _resolve(self, point_id, payload: dict) -> Optional[CodeChunk]:
+        chunk_id = payload.get("chunk_id")
+        if chunk_id is None:
+            # Older indexes copied the whole chunk into the payload
+            return CodeChunk(id=str(point_id), **payload)
+        if self.chunk_store is not None:
+            chunk = self.chunk_store.get_chunk(chunk_id)
+            if chunk is not None:
+                return chunk
+        fields = {k: v for k, v in payload.items() if k not in ("chunk_id", "content")}
+        if not fields:
+            # NumPy store: nothing but the id to fall back on
+            return None
+        return CodeChunk(id=chunk_id, content=payload.get("content", ""), **fields)
+
     def close(self):
         """Close the database connection."""
-        if self.client:
-            self.client.close()
+        if self.store:
+            self.store.close()
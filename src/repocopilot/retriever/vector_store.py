@@ -0,0 +1,661 @@
+import os
+import uuid
+import shutil
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+from ..common.columnar import StringColumn, file_offset, read_arrays, write_arrays
+
+VECTORS_FILE = "vectors.vec"
+HNSW_FILE = "vectors.hnsw"
+FORMAT_VERSION = 1
+
+QUANTIZATIONS = ("none", "int8", "binary")
+# Candidates rescored per requested hit; sign bits need a wider net than int8
+RESCORE_FACTORS = {"none": 1, "int8": 4, "binary": 10}
+
+# +-1 signs of the 8 bits of every byte value (binary codes are packed big-endian)
+_BYTE_SIGNS = (
+    np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).astype(np.float32)
+    * 2
+    - 1
+)
+
+# (chunk id, cosine similarity, payload) per hit
+Hit = Tuple[str, float, Dict[str, Any]]
+
+
+def vector_backend(backend: str = None) -> str:
+    """"qdrant" (embedded Qdrant, the default) or "numpy" (memory-mapped matrix)."""
+    return (backend or os.getenv("VECTOR_BACKEND", "qdrant")).lower()
+
+
+def vector_quantization(quantization: str = None) -> str:
+    """"none" (default), "int8" (scalar, 4x smaller) or "binary" (sign bits, 32x smaller)."""
+    quantization = (quantization or os.getenv("VECTOR_QUANTIZATION", "none")).lower()
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(
+            f"Unknown vector quantization '{quantization}' (use {', '.join(QUANTIZATIONS)})."
+        )
+    return quantization
+
+
+def open_vector_store(
+    index_dir: str,
+    vector_size: int = None,
+    backend: str = None,
+    collection_name: str = "repo_code",
+    quantization: str = None,
+) -> "VectorStore":
+    """
+    Opens the vector store of an index directory. With `vector_size` (building) the
+    store is created or reset to that size and `quantization` applies to what is
+    written; without it (searching) the backend is detected from the files the build
+    left, unless given explicitly.
+    """
+    if backend is None and vector_size is None:
+        has_matrix = os.path.exists(os.path.join(index_dir, VECTORS_FILE))
+        backend = "numpy" if has_matrix else "qdrant"
+    if vector_backend(backend) == "numpy":
+        return NumpyVectorStore(index_dir, vector_size, quantization=quantization)
+    return QdrantVectorStore(
+        os.path.join(index_dir, "qdrant"), collection_name, vector_size, quantization
+    )
+
+
+def vector_store_files(index_dir: str, collection_name: str = "repo_code") -> List[str]:
+    """Files a build rewrites, for either backend (to detect in-place rebuilds)."""
+    return [
+        os.path.join(index_dir, VECTORS_FILE),
+        os.path.join(index_dir, HNSW_FILE),
+        os.path.join(
+            index_dir, "qdrant", "collection", collection_name, "storage.sqlite"
+        ),
+    ]
+
+
+class VectorStore:
+    """Cosine-similarity store of one vector per chunk id."""
+
+    # True when the store was created empty (nothing to update incrementally)
+    recreated = False
+
+    def reset(self):
+        raise NotImplementedError
+
+    def upsert(
+        self, chunk_ids: List[str], vectors: List[List[float]], payloads: List[Dict]
+    ):
+        raise NotImplementedError
+
+    def delete(self, chunk_ids: List[str]):
+        raise NotImplementedError
+
+    def search(self, queries: np.ndarray, top_k: int) -> List[List[Hit]]:
+        """Best `top_k` hits for each row of `queries` (batched)."""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def save(self):
+        """Persists pending changes (no-op for stores that write through)."""
+
+    def close(self):
+        pass
+
+
+class QdrantVectorStore(VectorStore):
+    """
+    Embedded Qdrant (local mode) collection; points are keyed by a UUID of the chunk id.
+    Quantization is configured on the collection and searched with oversampling and
+    rescoring. Note that local mode scans the original vectors regardless; the setting
+    takes effect when the same collection is served by a Qdrant server.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        collection_name: str = "repo_code",
+        vector_size: int = None,
+        quantization: str = None,
+        rescore_factor: int = None,
+    ):
+        from qdrant_client import QdrantClient
+
+        self.path = path
+        self.collection_name = collection_name
+        self.vector_size = vector_size
+        self.quantization = vector_quantization(quantization)
+        self.rescore_factor = rescore_factor or int(os.getenv("VECTOR_RESCORE_FACTOR", 0))
+        self.client = QdrantClient(path=path)
+        if vector_size is not None:
+            self._ensure_collection()
+            if self.quantization != "none":
+                print(
+                    "ℹ️ Embedded Qdrant keeps scanning full vectors; quantization only "
+                    "saves memory on a Qdrant server or with VECTOR_BACKEND=numpy."
+                )
+
+    def _ensure_collection(self):
+        from qdrant_client import QdrantClient
+
+        collections = self.client.get_collections().collections
+        if not any(c.name == self.collection_name for c in collections):
+            self.recreated = True
+            self._create()
+            return
+
+        # Check if vector size matches, if not, recreate
+        config = self.client.get_collection(self.collection_name).config
+        size = config.params.vectors.size
+        if size == self.vector_size:
+            self._update_quantization(config.quantization_config)
+        else:
+            print(f"⚠️ Vector size mismatch ({size} != {self.vector_size}).")
+            # Close client before physical delete
+            self.client.close()
+            print(f"🧹 Physically removing {self.path} for clean rebuild...")
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.client = QdrantClient(path=self.path)
+            print(f"🆕 Creating new collection with size {self.vector_size}...")
+            self.recreated = True
+            self._create()
+
+    def _create(self):
+        from qdrant_client.models import Distance, VectorParams
+
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config=VectorParams(size=self.vector_size, distance=Distance.COSINE),
+            quantization_config=self._quantization_config(),
+        )
+
+    def _update_quantization(self, current):
+        from qdrant_client import models
+
+        wanted = self._quantization_config()
+        if type(current) is not type(wanted):
+            print(f"🗜️ Switching collection quantization to {self.quantization}...")
+            self.client.update_collection(
+                collection_name=self.collection_name,
+                quantization_config=wanted or models.Disabled.DISABLED,
+            )
+
+    def _quantization_config(self):
+        from qdrant_client import models
+
+        if self.quantization == "int8":
+            return models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+                )
+            )
+        if self.quantization == "binary":
+            return models.BinaryQuantization(
+                binary=models.BinaryQuantizationConfig(always_ram=True)
+            )
+        return None
+
+    def reset(self):
+        self.client.delete_collection(collection_name=self.collection_name)
+        self._create()
+
+    def upsert(self, chunk_ids, vectors, payloads):
+        from qdrant_client.models import PointStruct
+
+        points = [
+            PointStruct(id=point_id(cid), vector=vector, payload=payload)
+            for cid, vector, payload in zip(
+                chunk_ids, np.asarray(vectors, dtype=np.float32).tolist(), payloads
+            )
+        ]
+        self.client.upsert(collection_name=self.collection_name, points=points)
+
+    def delete(self, chunk_ids):
+        from qdrant_client.models import PointIdsList
+
+        if chunk_ids:
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=PointIdsList(points=[point_id(c) for c in chunk_ids]),
+            )
+
+    def search(self, queries, top_k):
+        from qdrant_client import models
+
+        # Quantized collections: over-fetch on the codes, rescore with the originals
+        params = models.SearchParams(
+            quantization=models.QuantizationSearchParams(
+                rescore=True,
+                oversampling=float(
+                    self.rescore_factor or RESCORE_FACTORS[self.quantization]
+                ),
+            )
+        )
+        # All queries in one batched request
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=[
+                models.QueryRequest(
+                    query=query, limit=top_k, params=params, with_payload=True
+                )
+                for query in np.atleast_2d(np.asarray(queries, dtype=np.float32)).tolist()
+            ],
+        )
+        return [
+            [
+                # Older indexes stored the chunk in the payload and no chunk_id
+                (p.payload.get("chunk_id", str(p.id)), p.score, p.payload)
+                for p in response.points
+            ]
+            for response in responses
+        ]
+
+    def count(self):
+        return self.client.count(collection_name=self.collection_name).count
+
+    def close(self):
+        # Explicitly close the client to release file locks
+        self.client.close()
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Unit-normalized vectors in one memory-mapped matrix (`vectors.vec`, float32 or
+    float16), searched in-process with blocked matrix products. No server, no lock
+    file, opening is O(header).
+
+    With `quantization` the scan runs over compact codes instead:
+    - "int8": one signed byte per dimension plus a per-vector scale
+    - "binary": one sign bit per dimension, compared by Hamming distance
+    The best `top_k * rescore_factor` candidates are then rescored against the
+    full-precision matrix (float16 unless `dtype` says otherwise). It stays on disk:
+    candidate rows are read with pread instead of through the memory map, so only
+    the codes become resident. `rescore=False` does not store that matrix at all
+    (smallest index, approximate scores).
+
+    For large corpora `save` can also build an ANN index:
+    - "ivf": spherical k-means lists stored in the same file; a query scans the
+      `nprobe` closest lists only
+    - "hnsw": an hnswlib graph in `vectors.hnsw` (requires the optional `hnswlib`;
+      it keeps its own float32 copy, so quantization does not apply)
+    Below `ann_min_size` vectors the exact search is used regardless.
+    """
+
+    def __init__(
+        self,
+        index_dir: str,
+        vector_size: int = None,
+        dtype: str = None,
+        index_type: str = None,
+        ann_min_size: int = None,
+        nprobe: int = None,
+        quantization: str = None,
+        rescore: bool = None,
+        rescore_factor: int = None,
+    ):
+        self.path = os.path.join(index_dir, VECTORS_FILE)
+        self.hnsw_path = os.path.join(index_dir, HNSW_FILE)
+        # Settings for what `save` writes; searches follow what the file contains
+        self.quantization = vector_quantization(quantization)
+        # Quantized indexes scan the codes; the matrix only rescores a few candidates
+        default_dtype = "float32" if self.quantization == "none" else "float16"
+        self.dtype = np.dtype(dtype or os.getenv("VECTOR_DTYPE") or default_dtype)
+        self.index_type = (index_type or os.getenv("VECTOR_INDEX", "flat")).lower()
+        self.ann_min_size = ann_min_size or int(os.getenv("VECTOR_ANN_MIN_SIZE", 20000))
+        self.nprobe = nprobe or int(os.getenv("VECTOR_IVF_NPROBE", 0))
+        if rescore is None:
+            rescore = os.getenv("VECTOR_RESCORE", "1") != "0"
+        self.rescore = rescore
+        self.rescore_factor = rescore_factor or int(os.getenv("VECTOR_RESCORE_FACTOR", 0))
+
+        self.dim = vector_size or 0
+        self._file = None  # (fd, offset of the matrix) when rescoring reads the file
+        self.reset()
+        self.recreated = False
+
+        if os.path.exists(self.path):
+            self._load()
+            if vector_size is not None and self.dim != vector_size:
+                print(f"⚠️ Vector size mismatch ({self.dim} != {vector_size}).")
+                self.reset(vector_size)
+        elif vector_size is not None:
+            self.recreated = True
+
+    def _load(self):
+        header, arrays = read_arrays(self.path)
+        if header.get("version") != FORMAT_VERSION:
+            raise FileNotFoundError(f"{self.path} has an unsupported format, please rebuild.")
+        self.ids = StringColumn(arrays["ids.blob"], arrays["ids.offsets"])
+        self.vectors = arrays.get("vectors")  # absent when stored without rescoring
+        self.dim = header.get("dim") or self.vectors.shape[1]
+        self.stored_quantization = header.get("quantization", "none")
+        self.codes = arrays.get("codes")
+        self.scales = arrays.get("scales")
+        self.close()
+        offset = None if self.codes is None else file_offset(self.vectors)
+        if offset is not None and hasattr(os, "pread"):
+            self._file = (os.open(self.path, os.O_RDONLY), offset)
+        self.ivf = self.hnsw = None
+        if "ivf.centroids" in arrays:
+            self.ivf = {k[4:]: v for k, v in arrays.items() if k.startswith("ivf.")}
+        if header.get("hnsw") and os.path.exists(self.hnsw_path):
+            self.hnsw = _load_hnsw(self.hnsw_path, self.dim, len(self.ids))
+
+    def reset(self, vector_size: int = None):
+        self.dim = vector_size or self.dim
+        self.ids = StringColumn.pack([])
+        self.vectors = np.zeros((0, self.dim), dtype=self.dtype)
+        self.stored_quantization = "none"
+        self.codes = self.scales = None
+        self.ivf = self.hnsw = None
+        self._pending: Dict[str, np.ndarray] = {}  # chunk id -> normalized vector
+        self._deleted: set = set()
+        self.recreated = True
+
+    def upsert(self, chunk_ids, vectors, payloads=None):
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+        for cid, vector in zip(chunk_ids, matrix):
+            self._pending[cid] = vector
+
+    def delete(self, chunk_ids):
+        for cid in chunk_ids:
+            self._deleted.add(cid)
+            self._pending.pop(cid, None)
+
+    def count(self):
+        if not self._pending and not self._deleted:
+            return len(self.ids)
+        stored = set(self.ids.to_list()) - self._deleted
+        return len(stored | set(self._pending))
+
+    def save(self):
+        """
+        Rewrites the file with pending upserts/deletes applied, re-quantizes and
+        (re)builds the ANN index. Changed settings take effect here.
+        """
+        old_ids = self.ids.to_list()
+        drop = self._deleted | set(self._pending)
+        keep = np.array(
+            [i for i, cid in enumerate(old_ids) if cid not in drop], dtype=np.int64
+        )
+        ids = [old_ids[i] for i in keep] + list(self._pending)
+        parts = [self._full_rows(keep)]
+        if self._pending:
+            parts.append(np.stack(list(self._pending.values())))
+        vectors = np.concatenate(parts)
+
+        column = StringColumn.pack(ids)
+        arrays = {"ids.blob": column.blob, "ids.offsets": column.offsets}
+        if self.quantization == "none" or self.rescore:
+            arrays["vectors"] = vectors.astype(self.dtype)
+        if self.quantization != "none":
+            arrays.update(_quantize(vectors, self.quantization))
+        header = {
+            "version": FORMAT_VERSION,
+            "metric": "cosine",
+            "dim": self.dim,
+            "quantization": self.quantization,
+            "hnsw": False,
+        }
+
+        ann = self.index_type if len(ids) >= self.ann_min_size else "flat"
+        if ann == "ivf":
+            print(f"🗂️ Training IVF index over {len(ids)} vectors...")
+            arrays.update({f"ivf.{k}": v for k, v in _train_ivf(vectors).items()})
+        elif ann == "hnsw":
+            print(f"🕸️ Building HNSW graph over {len(ids)} vectors...")
+            _build_hnsw(vectors, self.hnsw_path)
+            header["hnsw"] = True
+
+        write_arrays(self.path, arrays, header)
+        self._pending.clear()
+        self._deleted.clear()
+        self._load()
+
+    def search(self, queries, top_k):
+        queries = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        n = len(self.ids)
+        if n == 0 or top_k <= 0:
+            return [[] for _ in queries]
+        k = min(top_k, n)
+
+        if self.hnsw is not None:
+            self.hnsw.set_ef(max(64, 2 * k))
+            labels, distances = self.hnsw.knn_query(queries, k=k)
+            rows, scores = labels.astype(np.int64), 1.0 - distances
+        else:
+            # Quantized scans over-fetch candidates and rescore them at full precision
+            rescore = self.codes is not None and self.vectors is not None
+            factor = self.rescore_factor or RESCORE_FACTORS[self.stored_quantization]
+            fetch = min(n, k * factor) if rescore else k
+            if self.ivf is not None:
+                rows, scores = self._search_ivf(queries, fetch)
+            else:
+                rows, scores = self._search_exact(queries, fetch)
+            if rescore:
+                rows, scores = self._rescore(queries, rows, k)
+
+        hits = []
+        for row, score in zip(rows, scores):
+            ids = [self.ids[int(r)] for r in row if r >= 0]
+            # Only the chunk id is stored; the retriever reads the chunk from BM25
+            hits.append([(cid, float(s), {"chunk_id": cid}) for cid, s in zip(ids, score)])
+        return hits
+
+    def close(self):
+        if self._file is not None:
+            os.close(self._file[0])
+            self._file = None
+
+    def scan_bytes(self) -> int:
+        """Bytes a full scan reads: the codes when quantized, else the matrix."""
+        if self.codes is not None:
+            return self.codes.nbytes + (0 if self.scales is None else self.scales.nbytes)
+        return self.vectors.nbytes
+
+    def _scores(self, queries: np.ndarray, rows) -> np.ndarray:
+        """Similarity of each query to the stored `rows` (a slice or an index array)."""
+        if self.stored_quantization == "int8":
+            codes = np.asarray(self.codes[rows], dtype=np.float32)
+            return (queries @ codes.T) * self.scales[rows]
+        if self.stored_quantization == "binary":
+            # Asymmetric: the float query against the stored signs
+            codes = self.codes[rows]
+            if len(queries) >= 8:
+                # Batches amortize unpacking the signs into one matrix product
+                bits = np.unpackbits(codes, axis=1, count=self.dim)
+                signs = bits.astype(np.float32) * 2 - 1
+                return (queries @ signs.T) / np.sqrt(self.dim)
+            # Few queries: each code byte looks up its partial dot product in a
+            # per-query 256-entry table
+            n_bytes = codes.shape[1]
+            padded = np.zeros((len(queries), n_bytes * 8), dtype=np.float32)
+            padded[:, : self.dim] = queries
+            tables = (padded.reshape(len(queries), n_bytes, 8) @ _BYTE_SIGNS.T).reshape(
+                len(queries), -1
+            )
+            index = codes.astype(np.intp) + np.arange(n_bytes, dtype=np.intp) * 256
+            scores = np.stack([np.take(table, index).sum(axis=1) for table in tables])
+            return scores / np.sqrt(self.dim)
+        return queries @ np.asarray(self.vectors[rows], dtype=np.float32).T
+
+    def _full_rows(self, rows: np.ndarray) -> np.ndarray:
+        if self.vectors is not None:
+            return np.asarray(self.vectors[rows], dtype=np.float32)
+        # Stored without rescoring: the codes are all there is
+        return _dequantize(
+            self.codes[rows],
+            None if self.scales is None else self.scales[rows],
+            self.stored_quantization,
+            self.dim,
+        )
+
+    def _read_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Full-precision `rows` for rescoring, copied from the file when possible."""
+        if self._file is None:
+            return np.asarray(self.vectors[rows], dtype=np.float32)
+        # Touching the memory map would fault in (and keep) the neighbouring pages
+        # too, until most of the matrix is resident; pread copies just the rows
+        fd, offset = self._file
+        row_bytes = self.vectors.strides[0]
+        buffer = b"".join(
+            os.pread(fd, row_bytes, offset + int(row) * row_bytes) for row in rows
+        )
+        matrix = np.frombuffer(buffer, dtype=self.vectors.dtype)
+        return matrix.reshape(len(rows), self.dim).astype(np.float32)
+
+    def _search_exact(self, queries: np.ndarray, k: int):
+        """Blocked Q x V^T keeping a running top-k, so blocks are decoded one at a time."""
+        block = 65536
+        if self.stored_quantization == "binary":
+            # Unpacked signs / table indices per block stay around 32 MiB
+            block = max(1024, (1 << 22) // self.codes.shape[1])
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(self.ids), block):
+            scores = self._scores(queries, slice(start, start + block))
+            rows = np.broadcast_to(
+                np.arange(start, start + scores.shape[1]), scores.shape
+            )
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            if best_scores.shape[1] > k:
+                part = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, part, axis=1)
+                best_rows = np.take_along_axis(best_rows, part, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return (
+            np.take_along_axis(best_rows, order, axis=1),
+            np.take_along_axis(best_scores, order, axis=1),
+        )
+
+    def _rescore(self, queries: np.ndarray, candidates: np.ndarray, k: int):
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for q, found in enumerate(candidates):
+            # Sorted, so the memory map is read front to back
+            found = np.sort(found[found >= 0])
+            if not len(found):
+                continue
+            sims = self._read_rows(found) @ queries[q]
+            top = min(k, len(found))
+            part = np.argpartition(-sims, top - 1)[:top]
+            part = part[np.argsort(-sims[part], kind="stable")]
+            rows[q, :top] = found[part]
+            scores[q, :top] = sims[part]
+        return rows, scores
+
+    def _search_ivf(self, queries: np.ndarray, k: int):
+        centroids, offsets, members = (
+            self.ivf["centroids"],
+            self.ivf["offsets"],
+            self.ivf["rows"],
+        )
+        nprobe = self.nprobe or max(1, len(centroids) // 16)
+        probes = np.argsort(-(queries @ centroids.T), axis=1)[:, :nprobe]
+
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for q, lists in enumerate(probes):
+            candidates = np.concatenate(
+                [members[offsets[c] : offsets[c + 1]] for c in lists]
+            )
+            if not len(candidates):
+                continue
+            sims = self._scores(queries[q : q + 1], candidates)[0]
+            top = min(k, len(candidates))
+            part = np.argpartition(-sims, top - 1)[:top]
+            part = part[np.argsort(-sims[part], kind="stable")]
+            rows[q, :top] = candidates[part]
+            scores[q, :top] = sims[part]
+        return rows, scores
+
+
+def point_id(chunk_id: str) -> str:
+    """Deterministically converts a chunk id to the UUID used as Qdrant point id."""
+    return str(uuid.UUID(hashlib.md5(chunk_id.encode("utf-8")).hexdigest()))
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _quantize(vectors: np.ndarray, quantization: str) -> Dict[str, np.ndarray]:
+    if quantization == "binary":
+        return {"codes": np.packbits(vectors > 0, axis=1)}
+    # Symmetric per-vector scale: the largest component maps to +-127
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return {"codes": codes, "scales": scales.astype(np.float32)}
+
+
+def _dequantize(
+    codes: np.ndarray, scales: Optional[np.ndarray], quantization: str, dim: int
+) -> np.ndarray:
+    if quantization == "binary":
+        signs = np.unpackbits(codes, axis=1, count=dim).astype(np.float32) * 2 - 1
+        return signs / np.sqrt(dim)
+    return _normalize(codes.astype(np.float32) * scales[:, None])
+
+
+def _train_ivf(
+    vectors: np.ndarray, n_lists: int = None, iterations: int = 10, seed: int = 0
+) -> Dict[str, np.ndarray]:
+    """Spherical k-means on a sample, then every vector is filed under its closest centroid."""
+    n = len(vectors)
+    n_lists = n_lists or max(1, int(4 * np.sqrt(n)))
+    rng = np.random.default_rng(seed)
+    sample_size = min(n, max(256 * n_lists // 4, 50_000))
+    sample = np.asarray(vectors[rng.choice(n, sample_size, replace=False)], dtype=np.float32)
+
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        empty = np.bincount(assign, minlength=n_lists) == 0
+        # Re-seed empty lists with random samples
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize(sums)
+
+    assign = np.empty(n, dtype=np.int64)
+    for start in range(0, n, 65536):
+        block = np.asarray(vectors[start : start + 65536], dtype=np.float32)
+        assign[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    order = np.argsort(assign, kind="stable")
+    offsets = np.zeros(n_lists + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assign, minlength=n_lists), out=offsets[1:])
+    return {
+        "centroids": centroids.astype(np.float32),
+        "offsets": offsets,
+        "rows": order.astype(np.int64),
+    }
+
+
+def _import_hnswlib():
+    try:
+        import hnswlib
+    except ImportError as e:
+        raise ImportError(
+            "VECTOR_INDEX=hnsw needs the optional 'hnswlib' package (pip install hnswlib)."
+        ) from e
+    return hnswlib
+
+
+def _build_hnsw(vectors: np.ndarray, path: str, m: int = 16, ef_construction: int = 200):
+    hnswlib = _import_hnswlib()
+    index = hnswlib.Index(space="cosine", dim=vectors.shape[1])
+    index.init_index(max_elements=len(vectors), M=m, ef_construction=ef_construction)
+    index.add_items(np.asarray(vectors, dtype=np.float32), np.arange(len(vectors)))
+    index.save_index(path)
+
+
+def _load_hnsw(path: str, dim: int, size: int):
+    hnswlib = _import_hnswlib()
+    index = hnswlib.Index(space="cosine", dim=dim)
+    index.load_index(path, max_elements=size)
+    return index